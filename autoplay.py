@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AutoPlayer:
+    """
+    Play a strategy in a worker thread, so slow solver calls do not block the caller.
+
+    The worker makes at most `rate` moves per second (as fast as possible if rate is None).
+    It starts paused, single moves can be requested with step() and continuous play with
+    resume(). Moves change the game in the worker thread, observers get their events from
+    there, so an observer that draws must hand them over to its own thread.
+
+    Anything else that changes the game while the player is running should hold `lock`.
+    """
+
+    def __init__(self, strategy, rate=10.0, on_step=None, on_finish=None):
+        """
+        on_step is called with the report of every move and on_finish once the worker
+        stops, both from the worker thread.
+        """
+        self.strategy = strategy
+        self.game = strategy.game
+        self.rate = rate
+        self.on_step = on_step
+        self.on_finish = on_finish
+        self.steps = 0
+
+        self.lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._paused = True
+        self._requested = 0
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, name="autoplay", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def _signal(self, **state):
+        with self._changed:
+            for (name, value) in state.items():
+                setattr(self, name, value)
+            self._changed.notify()
+
+    def pause(self):
+        self._signal(_paused=True)
+
+    def resume(self):
+        self._signal(_paused=False)
+
+    def step(self):
+        """
+        Make one more move while paused.
+        """
+        with self._changed:
+            self._requested += 1
+            self._changed.notify()
+
+    def set_rate(self, rate):
+        self._signal(rate=rate)
+
+    def cancel(self, wait=True):
+        """
+        Stop the worker after the current move, optionally waiting for it to finish.
+        """
+        self._signal(_cancelled=True)
+        if wait and self._thread.is_alive() and threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _next(self):
+        """
+        Wait until the next move should be made, return False if the worker should stop.
+        """
+        with self._changed:
+            while not self._cancelled and self._paused and not self._requested:
+                self._changed.wait()
+            if self._cancelled:
+                return False
+            if self._requested:
+                self._requested -= 1
+            return True
+
+    def _delay(self, started):
+        """
+        Wait for the rest of the move interval, waking up early on any change of state.
+        """
+        with self._changed:
+            while not self._cancelled and not self._requested and not self._paused and self.rate:
+                left = started + 1 / self.rate - time.perf_counter()
+                if left <= 0:
+                    break
+                self._changed.wait(left)
+
+    def _run(self):
+        try:
+            while not self.game.is_over() and self._next():
+                started = time.perf_counter()
+                with self.lock:
+                    if self.game.is_over():
+                        break
+                    report = self.strategy.step()
+                self.steps += 1
+                if self.on_step is not None:
+                    self.on_step(report)
+                self._delay(started)
+        except Exception:
+            logger.exception("Auto play stopped after %d steps", self.steps)
+        finally:
+            if self.on_finish is not None:
+                self.on_finish()
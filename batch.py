@@ -0,0 +1,241 @@
+"""
+Simulator that plays many games of the same size at once on stacked numpy arrays.
+
+Every tick all boards are advanced together: fields around boundary fields whose count is
+already satisfied by the marked mines are opened, fields around boundary fields with as many
+covered neighbours as adjacent mines are marked, and regions without adjacent mines are flood
+filled, all with array operations over the whole batch. Only boards where these rules find
+nothing are handed to a strategy (see Strategy.step) on a copy of that one board, which
+deduces with its backend or guesses, and the result is copied back into the batch.
+
+Example:
+    from batch import BatchSimulator
+    print(BatchSimulator.from_seeds(16, 40, range(10000)).run())
+"""
+import random
+import time
+import numpy as np
+from board import Minesweeper, neighbour_sum, seeded_board
+from metrics import Recorder
+from strategy import SAT
+
+
+class BatchSimulator:
+    def __init__(self, mines, first_fields, strategy=SAT, options=None, seed=0):
+        """
+        Mines is a boolean array (boards, n, n) and first_fields a list of (row, column) first
+        clicks. Boards where the simple rules give no move are played one step by the
+        strategy class, created with keyword arguments options; seed is used for its guesses.
+        """
+        self.mines = np.ascontiguousarray(mines, dtype=bool)
+        self.boards, self.board_dim = self.mines.shape[:2]
+        self.num_mines = self.mines.sum(axis=(1, 2))
+        self.first_fields = list(first_fields)
+        self.strategy = strategy
+        self.options = options or {}
+        self.seed = seed
+        # one recorder for all strategy steps, so solver calls and guesses add up
+        self.metrics = Recorder(keep_steps=False)
+
+        # adjacent mine counts, 0 for mines like on Minesweeper
+        self.counts = neighbour_sum(self.mines)
+        self.counts[self.mines] = 0
+        self.covered = np.ones(self.mines.shape, dtype=bool)
+        self.flags = np.zeros(self.mines.shape, dtype=bool)
+        self.lost = np.zeros(self.boards, dtype=bool)
+        self.won = np.zeros(self.boards, dtype=bool)
+
+        # per board measurements; moves are strategy steps and ticks that opened fields on
+        # the board, a tick opens all fields the rules find safe at once, so there are fewer
+        # moves than steps of a game played by the strategy alone
+        self.moves = np.zeros(self.boards, dtype=np.int64)
+        self.strategy_steps = np.zeros(self.boards, dtype=np.int64)
+        self.solver_calls = np.zeros(self.boards, dtype=np.int64)
+        self.solver_time = np.zeros(self.boards)
+        self.guesses = np.zeros(self.boards, dtype=np.int64)
+        self.ticks = 0
+
+        # board -> (Minesweeper, strategy) for boards that needed the strategy
+        self.players = {}
+
+    @classmethod
+    def from_seeds(cls, board_dim, num_mines, seeds, **kwargs):
+        """
+        Batch with the same boards as Minesweeper(board_dim, num_mines, seed) gives for
+        every seed with random_position and set_mines (see seeded_board).
+        """
+        seeds = list(seeds)
+        mines = np.zeros((len(seeds), board_dim, board_dim), dtype=bool)
+        first_fields = []
+        for (board, seed) in enumerate(seeds):
+            first_field, mines[board] = seeded_board(board_dim, num_mines, seed)
+            first_fields.append(first_field)
+        return cls(mines, first_fields, **kwargs)
+
+    @classmethod
+    def from_corpus(cls, corpus, start=0, stop=None, **kwargs):
+        """
+        Batch with boards start..stop of a Corpus.
+        """
+        stop = len(corpus) if stop is None else min(stop, len(corpus))
+        n = corpus.board_dim
+        first = corpus.records["first"][start:stop]
+        return cls(corpus.mines(start, stop), [(int(f) // n, int(f) % n) for f in first], **kwargs)
+
+    def active(self):
+        return ~(self.lost | self.won)
+
+    def reveal(self, boards, opening):
+        """
+        Open covered fields in the boolean array opening (len(boards), n, n) on the given
+        boards and flood fill the regions without adjacent mines.
+        """
+        covered = self.covered[boards]
+        opening &= covered
+        self.lost[boards[(opening & self.mines[boards]).any(axis=(1, 2))]] = True
+
+        counts = self.counts[boards]
+        empty = counts == 0
+        empty &= ~self.mines[boards]
+        while True:
+            covered &= ~opening
+            # every layer is the covered neighbours of opened fields without adjacent mines
+            opening = neighbour_sum(opening & empty) > 0
+            opening &= covered
+            if not opening.any():
+                break
+        self.covered[boards] = covered
+        # opened fields can not stay marked
+        self.flags[boards] &= covered
+
+    def finish(self, boards):
+        """
+        Check which of the boards are won, only mines are left covered on them.
+        """
+        won = (self.covered[boards].sum(axis=(1, 2)) == self.num_mines[boards]) & ~self.lost[boards]
+        won_boards = boards[won]
+        self.won[won_boards] = True
+        self.flags[won_boards] = self.covered[won_boards]
+        for board in boards[won | self.lost[boards]].tolist():
+            self.players.pop(board, None)
+
+    def start(self):
+        opening = np.zeros(self.mines.shape, dtype=bool)
+        for (board, (row, column)) in enumerate(self.first_fields):
+            opening[board, row, column] = True
+        boards = np.arange(self.boards)
+        self.reveal(boards, opening)
+        self.finish(boards)
+
+    def tick(self):
+        """
+        Advance every active board by one move, returns number of boards still active.
+        """
+        boards = np.flatnonzero(self.active())
+        if not len(boards):
+            return 0
+        self.ticks += 1
+
+        covered = self.covered[boards]
+        flags = self.flags[boards]
+        counts = self.counts[boards]
+        boundary = ~covered & (counts > 0)
+        covered_around = neighbour_sum(covered)
+        flags_around = neighbour_sum(flags)
+        # boundary fields that still have unknown neighbours
+        open_sources = boundary & (covered_around > flags_around)
+
+        # all mines around a field are marked -> other covered neighbours are safe,
+        # as many covered neighbours as mines -> all of them are mines
+        safe = neighbour_sum(open_sources & (counts == flags_around)) > 0
+        safe &= covered
+        safe &= ~flags
+        mines = neighbour_sum(open_sources & (counts == covered_around)) > 0
+        mines &= covered
+        mines &= ~flags
+
+        self.flags[boards] |= mines
+        moved = safe.any(axis=(1, 2))
+        if moved.any():
+            self.reveal(boards[moved], safe[moved])
+            self.moves[boards[moved]] += 1
+
+        # boards where the rules found nothing go to the strategy
+        for board in boards[~moved & ~mines.any(axis=(1, 2))].tolist():
+            self.strategy_step(board)
+
+        self.finish(boards)
+        return int(self.active().sum())
+
+    def strategy_step(self, board):
+        """
+        Make one strategy step for the board and copy the result back.
+
+        Every board has its own game and strategy, created on the first step and kept until
+        the game is over, so the constraints and the caches of the strategy carry over
+        between steps. Before a step the game is brought up to date with the fields opened
+        and marked by the batch since the last one.
+        """
+        player = self.players.get(board)
+        if player is None:
+            game = Minesweeper(self.board_dim, int(self.num_mines[board]))
+            game.mines = self.mines[board].copy()
+            game.counts = self.counts[board].copy()
+            strategy = self.strategy(game, metrics=self.metrics, **self.options)
+            player = self.players[board] = (game, strategy)
+        game, strategy = player
+
+        covered = self.covered[board]
+        opened = np.flatnonzero(game.covered & ~covered)
+        game.covered[...] = covered
+        game.opened = covered.size - int(np.count_nonzero(covered))
+        for id in (opened + 1).tolist():
+            strategy.constraints.open(id)
+        for id in (np.flatnonzero(self.flags[board] & ~game.flags) + 1).tolist():
+            field = game.get_field_by_id(id)
+            field.marked_mine = True
+            game.marked.add(field)
+            strategy.constraints.resolve(id, True)
+        boundary = opened[game.counts.flat[opened] > 0]
+        strategy.newly_opened += [game.get_field_by_id(id) for id in (boundary + 1).tolist()]
+
+        solver_calls, solver_time = strategy.solver_calls, strategy.solver_time
+        guesses = self.metrics.counters.get("guesses", 0)
+        strategy.step()
+        self.solver_calls[board] += strategy.solver_calls - solver_calls
+        self.solver_time[board] += strategy.solver_time - solver_time
+        self.guesses[board] += self.metrics.counters.get("guesses", 0) - guesses
+        self.strategy_steps[board] += 1
+        self.moves[board] += 1
+
+        self.covered[board] = game.covered
+        # marks are used as known mines by the rules, so only certain ones are kept
+        if strategy.sound:
+            self.flags[board] = game.flags
+        self.flags[board] &= game.covered
+        self.lost[board] = game.lost
+
+    def run(self, max_ticks=100000):
+        """
+        Play all games to the end (or max_ticks ticks) and return summary of the batch.
+        """
+        random.seed(self.seed)
+        start = time.perf_counter()
+        self.start()
+        while self.tick() and self.ticks < max_ticks:
+            pass
+        elapsed = time.perf_counter() - start
+
+        wins = int(self.won.sum())
+        return {
+            "games": self.boards,
+            "wins": wins,
+            "win_rate": wins / self.boards,
+            "unfinished": int(self.active().sum()),
+            "ticks": self.ticks,
+            "strategy_steps": int(self.strategy_steps.sum()),
+            "solver_calls": int(self.solver_calls.sum()),
+            "guesses": int(self.guesses.sum()),
+            "time": elapsed,
+            "games_per_second": self.boards / elapsed if elapsed else 0.0,
+        }
@@ -0,0 +1,522 @@
+"""
+Benchmark solving strategies on many seeded games without GUI.
+
+Example:
+    python3 benchmark.py --strategies CSP SAT --sizes 8 16 --mines 10 40 --games 200 --json results.json
+
+Results of SAT are the same in every run for the same seeds. Results of CSP vary between
+runs (see CSP.reproducible) and are marked with "reproducible": false in the JSON report.
+
+With --tune, SAT strategy is run with every pysat solver and cardinality encoding pair on the
+same seeded games, and the pair with the lowest time of the "deduce" phase (solver setup,
+encoding of the constraints and solving) is chosen for every board size and number of mines:
+    python3 benchmark.py --tune --sizes 16 30 --density 0.12 0.2 --json tuning.json
+    python3 benchmark.py --strategies SAT --sat-tuning tuning.json ...
+
+With --corpus, games are played on the boards stored in a corpus file (see corpus.py)
+instead of boards generated from the seeds:
+    python3 corpus.py boards.msw --size 16 --mines 40 --boards 10000
+    python3 benchmark.py --corpus boards.msw --games 10000
+
+With --batch, games are played in batches by BatchSimulator (see batch.py), which advances
+all boards of a batch together and uses the strategy only where simple rules get stuck.
+One tick opens all fields the rules find safe, so batches report moves (moves_per_game,
+time_per_move) instead of steps, see BatchSimulator.moves:
+    python3 benchmark.py --batch 1000 --games 10000
+
+With --startup, cold start of the command line (driver.py) is measured in fresh processes
+and compared with STARTUP_BUDGET, the exit status is 1 if it is over the budget:
+    python3 benchmark.py --startup
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+from batch import BatchSimulator
+from board import Minesweeper
+from corpus import Corpus
+from metrics import PHASES, Recorder
+from strategy import SAT, STRATEGIES
+
+# corpus files opened by this process, by path
+CORPORA = {}
+
+# cold start of driver.py in seconds, on top of a process that only imports numpy, which
+# every entry point needs for the board
+STARTUP_BUDGET = 0.15
+
+# prints the backend and GUI modules loaded by driver.main with the given arguments
+LOADED_MODULES = "import sys, driver; driver.main(sys.argv[1:]); " \
+                 "print(*(m for m in ('tkinter', 'cassowary', 'pysat') if m in sys.modules), file=sys.stderr)"
+
+# fields written to CSV, in this order
+COLUMNS = ["strategy", "board_dim", "num_mines", "games", "wins", "win_rate", "steps_per_game",
+           "time_per_step", "moves_per_game", "time_per_move", "time_per_game", "solver_calls_per_game",
+           "solver_time_per_game", "guesses_per_game", "wrong_per_game", "rejected_per_game",
+           "rejected_correct_per_game", "certify_time_per_game", "games_per_second", "max_tableau_size",
+           "unfinished"]
+
+
+def play_game(task):
+    """
+    Play one seeded game and return its measurements.
+
+    Task is a tuple (strategy name, board_dim, num_mines, seed, max_steps, options, board),
+    options are keyword arguments for the strategy. Board is None for a board generated from
+    the seed, or (corpus path, index) for a stored board, whose own seed is used instead.
+    """
+    strategy_name, board_dim, num_mines, seed, max_steps, options, board = task
+    if board is not None:
+        path, index = board
+        board = open_corpus(path)[index]
+        seed = board.seed
+    random.seed(seed)
+
+    start = time.perf_counter()
+    game = Minesweeper(board_dim, num_mines, seed=seed)
+    strategy = STRATEGIES[strategy_name](game, metrics=Recorder(keep_steps=False), **options)
+
+    if board is None:
+        first_field = game.random_position()
+        game.set_mines(first_field)
+    else:
+        first_field = board.first_field
+        game.set_mines(first_field, board.mines)
+    strategy.first_step(first_field=first_field)
+    steps = 0
+    tableau_size = 0
+    while not game.is_over() and steps < max_steps:
+        report = strategy.step()
+        tableau_size = max(tableau_size, report.get("tableau_size", 0))
+        steps += 1
+
+    return {
+        "strategy": strategy_name,
+        "board_dim": board_dim,
+        "num_mines": num_mines,
+        "options": options,
+        "seed": seed,
+        "won": game.won,
+        "finished": game.is_over(),
+        "steps": steps,
+        "time": time.perf_counter() - start,
+        "solver_calls": strategy.solver_calls,
+        "solver_time": strategy.solver_time,
+        "guesses": strategy.metrics.counters.get("guesses", 0),
+        "wrong": wrong_results(strategy.metrics.counters),
+        "rejected": strategy.metrics.counters.get("rejected", 0),
+        "rejected_correct": strategy.metrics.counters.get("rejected_correct", 0),
+        "phase_time": strategy.metrics.times,
+        "tableau_size": tableau_size,
+    }
+
+
+def wrong_results(counters):
+    """
+    Return number of mines and safe fields found by the backend that were wrong, counted
+    before certification
+    """
+    return counters.get("wrong_mines", 0) + counters.get("wrong_safe", 0)
+
+
+def open_corpus(path):
+    """
+    Return Corpus for the path, every process maps the file once.
+    """
+    corpus = CORPORA.get(path)
+    if corpus is None:
+        corpus = CORPORA[path] = Corpus(path)
+    return corpus
+
+
+def play_batch(task):
+    """
+    Play games with BatchSimulator and return measurements of every game.
+
+    Task is like in play_game, with lists of seeds and of boards of the games instead of
+    a single one. Time and phase times of the batch are split evenly between its games.
+    Games report moves instead of steps, see BatchSimulator.moves.
+    """
+    strategy_name, board_dim, num_mines, seeds, max_steps, options, boards = task
+    kwargs = {"strategy": STRATEGIES[strategy_name], "options": options, "seed": seeds[0]}
+    if boards[0] is None:
+        simulator = BatchSimulator.from_seeds(board_dim, num_mines, seeds, **kwargs)
+    else:
+        corpus = open_corpus(boards[0][0])
+        start, stop = boards[0][1], boards[-1][1] + 1
+        seeds = corpus.records["seed"][start:stop].tolist()
+        simulator = BatchSimulator.from_corpus(corpus, start, stop, **kwargs)
+    report = simulator.run(max_ticks=max_steps)
+
+    n = simulator.boards
+    phase_time = {phase: elapsed / n for (phase, elapsed) in simulator.metrics.times.items()}
+    counters = simulator.metrics.counters
+    return [{
+        "strategy": strategy_name,
+        "board_dim": board_dim,
+        "num_mines": num_mines,
+        "options": options,
+        "seed": seeds[board],
+        "won": bool(simulator.won[board]),
+        "finished": bool(simulator.won[board] or simulator.lost[board]),
+        "moves": int(simulator.moves[board]),
+        "time": report["time"] / n,
+        "solver_calls": int(simulator.solver_calls[board]),
+        "solver_time": float(simulator.solver_time[board]),
+        "guesses": int(simulator.guesses[board]),
+        "wrong": wrong_results(counters) / n,
+        "rejected": counters.get("rejected", 0) / n,
+        "rejected_correct": counters.get("rejected_correct", 0) / n,
+        "phase_time": phase_time,
+        "tableau_size": 0,
+    } for board in range(n)]
+
+
+def summarize(games):
+    """
+    Aggregate measurements of the games played with the same configuration.
+    """
+    first = games[0]
+    total_time = sum(g["time"] for g in games)
+    wins = sum(g["won"] for g in games)
+    n = len(games)
+    # games of a batch count moves, which are not steps (see play_batch)
+    batch = "moves" in first
+    total_steps = sum(g["moves"] if batch else g["steps"] for g in games)
+    time_per_step = total_time / total_steps if total_steps else 0.0
+    return {
+        "strategy": first["strategy"],
+        "board_dim": first["board_dim"],
+        "num_mines": first["num_mines"],
+        "games": n,
+        "wins": wins,
+        "win_rate": wins / n,
+        "steps_per_game": None if batch else total_steps / n,
+        "time_per_step": None if batch else time_per_step,
+        "moves_per_game": total_steps / n if batch else None,
+        "time_per_move": time_per_step if batch else None,
+        "time_per_game": total_time / n,
+        "solver_calls_per_game": sum(g["solver_calls"] for g in games) / n,
+        "solver_time_per_game": sum(g["solver_time"] for g in games) / n,
+        "guesses_per_game": sum(g["guesses"] for g in games) / n,
+        "wrong_per_game": sum(g["wrong"] for g in games) / n,
+        "rejected_per_game": sum(g["rejected"] for g in games) / n,
+        "rejected_correct_per_game": sum(g["rejected_correct"] for g in games) / n,
+        "certify_time_per_game": sum(g["phase_time"]["certify"] for g in games) / n,
+        # JSON report only
+        "reproducible": STRATEGIES[first["strategy"]].reproducible,
+        "phase_time_per_game": {phase: sum(g["phase_time"][phase] for g in games) / n for phase in PHASES},
+        "games_per_second": n / total_time if total_time else 0.0,
+        "max_tableau_size": max(g["tableau_size"] for g in games),
+        "unfinished": sum(not g["finished"] for g in games),
+    }
+
+
+def configurations(args):
+    """
+    Generate (strategy, board_dim, num_mines) for every requested combination.
+    Mines can be given as counts (--mines) or as fractions of the board (--density).
+    With a corpus the board size and mines are the ones stored in it.
+    """
+    if args.corpus:
+        corpus = Corpus(args.corpus)
+        for strategy_name in args.strategies:
+            yield strategy_name, corpus.board_dim, corpus.num_mines
+        return
+
+    for strategy_name, board_dim in itertools.product(args.strategies, args.sizes):
+        counts = list(args.mines or [])
+        counts += [max(1, round(d * board_dim ** 2)) for d in args.density or []]
+        for num_mines in counts:
+            # first click is always safe, so at least one field must stay free
+            if num_mines < board_dim ** 2:
+                yield strategy_name, board_dim, num_mines
+
+
+def boards(args):
+    """
+    Return board of every game of a configuration: None for boards generated from the seeds,
+    or (corpus path, index) for the first --games boards of the corpus.
+    """
+    if args.corpus:
+        return [(args.corpus, index) for index in range(min(args.games, len(Corpus(args.corpus))))]
+    return [None] * args.games
+
+
+def git_revision():
+    try:
+        # revision of this checkout, also when the benchmark is run from another directory
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def strategy_options(args, tuning, strategy_name, board_dim, num_mines):
+    """
+    Keyword arguments for the strategy, SAT setup is taken from tuning (the parsed
+    --sat-tuning report) if given. Certification is used by the strategies that support
+    the chosen method.
+    """
+    options = {}
+    if strategy_name == "SAT" and tuning is not None:
+        options = best_setup(tuning, board_dim, num_mines)
+    if args.certify and args.certify in STRATEGIES[strategy_name].certify_methods:
+        options["certify"] = args.certify
+    return options
+
+
+def play_all(args, tasks):
+    """
+    Play all tasks on a process pool, returns list of game results and elapsed time.
+    With --batch, consecutive games of the same configuration are played as one batch.
+    """
+    start = time.perf_counter()
+    workers = args.workers or os.cpu_count()
+    with Pool(workers) as pool:
+        if args.batch:
+            batches = []
+            for (_, group) in itertools.groupby(tasks, key=lambda task: task[:3] + (task[5],)):
+                group = list(group)
+                for i in range(0, len(group), args.batch):
+                    chunk = group[i:i + args.batch]
+                    batches.append(chunk[0][:3] + ([task[3] for task in chunk], chunk[0][4], chunk[0][5],
+                                                  [task[6] for task in chunk]))
+            games = [game for games in pool.map(play_batch, batches, chunksize=1) for game in games]
+        else:
+            games = pool.map(play_game, tasks, chunksize=max(1, len(tasks) // (4 * workers)))
+    return games, time.perf_counter() - start, workers
+
+
+def run(args):
+    configs = list(configurations(args))
+    tuning = None
+    if args.sat_tuning:
+        with open(args.sat_tuning) as f:
+            tuning = json.load(f)
+    options = {config: strategy_options(args, tuning, *config) for config in configs}
+    tasks = [(strategy_name, board_dim, num_mines, args.seed + i, args.max_steps,
+              options[(strategy_name, board_dim, num_mines)], board)
+             for (strategy_name, board_dim, num_mines) in configs
+             for (i, board) in enumerate(boards(args))]
+
+    games, elapsed, workers = play_all(args, tasks)
+
+    results = []
+    for config in configs:
+        config_games = [g for g in games if (g["strategy"], g["board_dim"], g["num_mines"]) == config]
+        results.append(summarize(config_games))
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "workers": workers,
+        "seed": args.seed,
+        "elapsed": elapsed,
+        "games_per_second": len(games) / elapsed,
+        "results": results,
+    }
+
+
+def process_time(command, runs):
+    """
+    Return median wall time of running command in a new process runs times.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def startup(args):
+    """
+    Measure cold start of driver.py: parsing arguments without playing, and playing one small
+    headless game with every strategy, which also loads its backend. Every command is
+    compared with a process that only imports numpy.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    commands = {"no game": ["--headless", "--games", "0"]}
+    for strategy_name in args.strategies:
+        commands[strategy_name] = ["--headless", "--strategy", strategy_name, "--size", "4", "--mines", "3",
+                                   "--seed", "0"]
+
+    numpy_time = process_time([sys.executable, "-c", "import numpy"], args.startup)
+    results = []
+    for (name, arguments) in commands.items():
+        elapsed = process_time([sys.executable, os.path.join(directory, "driver.py")] + arguments, args.startup)
+        loaded = subprocess.run([sys.executable, "-c", LOADED_MODULES] + arguments, cwd=directory, check=True,
+                                capture_output=True, text=True).stderr.split()
+        results.append({
+            "command": name,
+            "time": elapsed,
+            "overhead": elapsed - numpy_time,
+            "modules": loaded,
+            "within_budget": elapsed - numpy_time <= STARTUP_BUDGET,
+        })
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "runs": args.startup,
+        "budget": STARTUP_BUDGET,
+        "numpy_import": numpy_time,
+        "results": results,
+    }
+
+
+def sat_setups(solvers, encodings):
+    """
+    Generate (solver_name, encoding) pairs that can be used together, unknown solvers and
+    pairs that do not fit are reported and skipped
+    """
+    for solver_name, encoding in itertools.product(solvers, encodings):
+        try:
+            SAT(None, solver_name=solver_name, encoding=encoding)
+        except (ValueError, NotImplementedError) as error:
+            print("Skipping {} with {}: {}".format(solver_name, encoding, error), file=sys.stderr)
+            continue
+        yield solver_name, encoding
+
+
+def tune(args):
+    """
+    Play the same seeded games with every SAT setup and find the fastest one for every
+    board size and number of mines. Setups are ranked by the time of the "deduce" phase,
+    which also covers creating the solvers and encoding the constraints, not only the
+    solver calls.
+    """
+    configs = sorted({(board_dim, num_mines) for (_, board_dim, num_mines) in configurations(args)})
+    setups = list(sat_setups(args.solvers, args.encodings))
+    if not setups:
+        raise SystemExit("No usable pair of the solvers and encodings")
+    tasks = [("SAT", board_dim, num_mines, args.seed + i, args.max_steps,
+              {"solver_name": solver_name, "encoding": encoding}, board)
+             for (board_dim, num_mines) in configs
+             for (solver_name, encoding) in setups
+             for (i, board) in enumerate(boards(args))]
+
+    games, elapsed, workers = play_all(args, tasks)
+
+    results = []
+    best = []
+    for (board_dim, num_mines) in configs:
+        config_results = []
+        for (solver_name, encoding) in setups:
+            setup_games = [g for g in games if (g["board_dim"], g["num_mines"]) == (board_dim, num_mines)
+                           and g["options"] == {"solver_name": solver_name, "encoding": encoding}]
+            result = summarize(setup_games)
+            result.update(solver_name=solver_name, encoding=encoding)
+            config_results.append(result)
+        results += config_results
+
+        fastest = min(config_results, key=lambda r: r["phase_time_per_game"]["deduce"])
+        best.append({
+            "board_dim": board_dim,
+            "num_mines": num_mines,
+            "density": num_mines / board_dim ** 2,
+            "solver_name": fastest["solver_name"],
+            "encoding": fastest["encoding"],
+            "deduce_time_per_game": fastest["phase_time_per_game"]["deduce"],
+            "solver_time_per_game": fastest["solver_time_per_game"],
+        })
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "workers": workers,
+        "seed": args.seed,
+        "elapsed": elapsed,
+        "results": results,
+        "best": best,
+    }
+
+
+def best_setup(tuning, board_dim, num_mines):
+    """
+    Return SAT keyword arguments (solver_name, encoding) of the tuned configuration closest
+    to the given board size and mine density.
+    """
+    density = num_mines / board_dim ** 2
+    closest = min(tuning["best"], key=lambda b: (abs(math.log(b["board_dim"] / board_dim)),
+                                                  abs(b["density"] - density)))
+    return {"solver_name": closest["solver_name"], "encoding": closest["encoding"]}
+
+
+def write_csv(results, file):
+    columns = COLUMNS
+    if results and "solver_name" in results[0]:
+        columns = COLUMNS[:1] + ["solver_name", "encoding"] + COLUMNS[1:]
+    writer = csv.DictWriter(file, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for row in results:
+        writer.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Minesweeper solving strategies.")
+    parser.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES), default=sorted(STRATEGIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[8, 16])
+    parser.add_argument("--mines", nargs="+", type=int, help="number of mines on the board")
+    parser.add_argument("--density", nargs="+", type=float, help="number of mines as a fraction of fields")
+    parser.add_argument("--games", type=int, default=100, help="games per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, next games use seed+1, ...")
+    parser.add_argument("--corpus", help="play the boards stored in this corpus file (see corpus.py)")
+    parser.add_argument("--batch", type=int, help="play games in batches of this size (see batch.py)")
+    parser.add_argument("--certify", choices=["lp", "sat"],
+                        help="prove every result of the backend before it is used (see Strategy.certify_result)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: CPU count)")
+    parser.add_argument("--max-steps", type=int, default=100000, help="stop unfinished games after this many steps")
+    parser.add_argument("--tune", action="store_true", help="find the fastest SAT solver and encoding")
+    parser.add_argument("--solvers", nargs="+", default=["minicard", "gluecard4", "glucose4", "cadical153", "lingeling"],
+                        help="pysat solvers tried with --tune")
+    parser.add_argument("--encodings", nargs="+", choices=SAT.encodings, default=list(SAT.encodings),
+                        help="cardinality encodings tried with --tune")
+    parser.add_argument("--sat-tuning", help="use SAT setup from this --tune JSON report")
+    parser.add_argument("--startup", type=int, nargs="?", const=10,
+                        help="measure cold start of driver.py, median of this many runs (default: 10)")
+    parser.add_argument("--json", help="write JSON report to this file ('-' for stdout)")
+    parser.add_argument("--csv", help="write CSV report to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+    if not args.mines and not args.density:
+        args.density = [0.15]
+
+    if args.startup:
+        report = startup(args)
+        if not args.json:
+            args.json = "-"
+    else:
+        report = tune(args) if args.tune else run(args)
+
+    if args.json:
+        if args.json == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+    if args.csv:
+        if args.csv == "-":
+            write_csv(report["results"], sys.stdout)
+        else:
+            with open(args.csv, "w", newline="") as f:
+                write_csv(report["results"], f)
+    if not args.json and not args.csv:
+        write_csv(report["results"], sys.stdout)
+    if args.startup and not all(result["within_budget"] for result in report["results"]):
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,171 +1,342 @@
-import tkinter as tk
-from tkinter import ttk
-from random import randrange
-import math
-from strategy import CSP, SAT
+import logging
+from collections import namedtuple
+from random import randint
+import numpy as np
+from neighbours import NeighbourTable
+from frontier import Frontier
+
+logger = logging.getLogger(__name__)
+
+# ids of newly opened fields and of the opened fields that have adjacent mines
+Reveal = namedtuple("Reveal", ["opened", "boundary"])
 
 
 class Field:
+    """
+    Field is a view on one cell of the board, its state is kept in the board arrays.
+
+    Fields are created when they are accessed and hold no state of their own, two views of
+    the same cell are equal and have the same hash.
+    """
+    __slots__ = ("game", "row", "column", "id")
+
     # a[row][col]
-    def __init__(self, i, j, board_dim, is_mine=False):
+    def __init__(self, game, i, j):
+        self.game = game
         self.row = i
         self.column = j
-        self.id = int(board_dim * i + j + 1)
-        self.adjacent_mines = 0
-        self.covered = True
-        self.is_mine = is_mine
-        self.marked_mine = False
+        self.id = game.columns * i + j + 1
+
+    @property
+    def is_mine(self):
+        return bool(self.game.mines[self.row, self.column])
+
+    @property
+    def adjacent_mines(self):
+        return int(self.game.counts[self.row, self.column])
+
+    @property
+    def covered(self):
+        return bool(self.game.covered[self.row, self.column])
+
+    @covered.setter
+    def covered(self, value):
+        self.game.covered[self.row, self.column] = value
+
+    @property
+    def marked_mine(self):
+        return bool(self.game.flags[self.row, self.column])
+
+    @marked_mine.setter
+    def marked_mine(self, value):
+        self.game.flags[self.row, self.column] = value
+
+    def __eq__(self, other):
+        return isinstance(other, Field) and self.id == other.id and self.game is other.game
+
+    def __hash__(self):
+        return hash(self.id)
 
     def __repr__(self):
         return "[{}][{}]: {}".format(self.row, self.column, self.adjacent_mines)
 
 
+class FieldRow:
+    """
+    One row of FieldGrid, indexing it by column creates the Field view.
+    """
+    __slots__ = ("game", "row")
+
+    def __init__(self, game, row):
+        self.game = game
+        self.row = row
+
+    def __len__(self):
+        return self.game.columns
+
+    def __getitem__(self, column):
+        n = self.game.columns
+        if column < 0:
+            column += n
+        if not 0 <= column < n:
+            raise IndexError("column index out of range")
+        return Field(self.game, self.row, int(column))
+
+    def __iter__(self):
+        for column in range(self.game.columns):
+            yield Field(self.game, self.row, column)
+
+
+class FieldGrid:
+    """
+    Fields of the board indexed as grid[row][column], like a list of lists of Fields.
+
+    Nothing is stored per field, so the grid takes constant memory on any board size and
+    the state of the board stays only in the game arrays.
+    """
+    __slots__ = ("game",)
+
+    def __init__(self, game):
+        self.game = game
+
+    def __len__(self):
+        return self.game.rows
+
+    def __getitem__(self, row):
+        n = self.game.rows
+        if row < 0:
+            row += n
+        if not 0 <= row < n:
+            raise IndexError("row index out of range")
+        return FieldRow(self.game, int(row))
+
+    def __iter__(self):
+        for row in range(self.game.rows):
+            yield FieldRow(self.game, row)
+
+
+class GameObserver:
+    """
+    Base class for objects that want to follow a game, e.g. the tkinter window.
+
+    Every hook is a no-op so observers only override the events they care about.
+    """
+
+    def field_opened(self, field):
+        pass
+
+    def field_marked(self, field):
+        pass
+
+    def field_unmarked(self, field):
+        pass
+
+    def game_lost(self, field):
+        pass
+
+    def game_won(self):
+        pass
+
+
+def neighbour_sum(a, padded=False):
+    """
+    Return int8 array with the number of true (non-zero) values among the 8 neighbours of
+    every field, fields outside of the board count as 0. A is an array (rows, columns) or a
+    batch of boards (boards, rows, columns). With padded set, a already has a border of one
+    field around every board (e.g. from adjacent chunks) and the result is without it.
+    """
+    a = a.view(np.int8) if a.dtype == bool else a
+    if not padded:
+        a = np.pad(a, [(0, 0)] * (a.ndim - 2) + [(1, 1), (1, 1)])
+    rows, columns = a.shape[-2] - 2, a.shape[-1] - 2
+    total = np.zeros(a.shape[:-2] + (rows, columns), dtype=np.int8)
+    for i in range(3):
+        for j in range(3):
+            if i != 1 or j != 1:
+                total += a[..., i:i + rows, j:j + columns]
+    return total
+
+
+def random_field(rng, board_dim):
+    """
+    Return random (row, column) tuple on the board
+    """
+    row, column = rng.integers(0, board_dim, size=2)
+    return int(row), int(column)
+
+
+def random_mines(rng, board_dim, num_mines, first_field):
+    """
+    Return flat indices of num_mines distinct random fields of the board, without the
+    first_field (row, column).
+    """
+    row, column = first_field
+    first = row * board_dim + column
+
+    # sample from all fields except the first one and shift indices behind it
+    positions = rng.choice(board_dim ** 2 - 1, size=num_mines, replace=False)
+    positions[positions >= first] += 1
+    return positions
+
+
+def seeded_board(board_dim, num_mines, seed):
+    """
+    Return first field (row, column) and boolean mines array (board_dim, board_dim) of the
+    board that Minesweeper(board_dim, num_mines, seed) gets with random_position and
+    set_mines, both draw from the same random_field and random_mines.
+    """
+    rng = np.random.default_rng(seed)
+    first_field = random_field(rng, board_dim)
+    mines = np.zeros((board_dim, board_dim), dtype=bool)
+    mines.flat[random_mines(rng, board_dim, num_mines, first_field)] = True
+    return first_field, mines
+
+
 class Minesweeper:
-    def __init__(self, n, k):
+    # mine density for boards whose number of mines is not fixed up front (see chunked.py),
+    # None when mines are placed on the whole board at once
+    density = None
+
+    def __init__(self, n, k, seed=None):
         """
         Create board object with dimensions nxn and k mines inside
-        set at random locations
+        set at random locations. Seed is used for the random generator of the board
+        so the same seed gives the same game.
+
+        The board has no GUI, observers (see GameObserver) are notified about every
+        change so a window can be attached on top of it.
+
+        State of the board is kept in numpy arrays of shape (n, n):
+        mines, covered, flags (marked as mine) and counts (number of adjacent mines).
+        Ids of adjacent fields are computed by self.neighbours (see NeighbourTable).
+        Board code that works on many fields at once goes through take and put, so
+        subclasses can keep the state elsewhere.
         """
-        self.labels = {}
         self.board_dim = n
+        self.rows = self.columns = n
         self.num_mines = k
-        self.marked = []
-        self.board = [[Field(j, i, self.board_dim) for i in range(n)] for j in range(n)]
-        self.buttons = []
-        self.opened = 0
-        self.strategy = None
+        self.rng = np.random.default_rng(seed)
+        self.neighbours = NeighbourTable(n, n)
+        self.observers = []
+        self.reset()
 
-        self.setup_gui()
-
-    def get_field_by_id(self, id):
-        return self.board[math.floor((id - 1) / self.board_dim)][(id - 1) % self.board_dim]
-
-    def _right_click(self, event):
+    def reset(self):
         """
-        Handle right click on the grid
-        If the field is marked as mine, we are removing the mark and vice versa.
+        Put the board into its initial state: all fields covered and no mines set.
         """
-        grid_info = event.widget.grid_info()
-        column, row = grid_info["column"], grid_info["row"]
+        shape = (self.board_dim, self.board_dim)
+        self.mines = np.zeros(shape, dtype=bool)
+        self.covered = np.ones(shape, dtype=bool)
+        self.flags = np.zeros(shape, dtype=bool)
+        self.counts = np.zeros(shape, dtype=np.int8)
 
-        if self.board[row][column].marked_mine:
-            self.mark_field_safe(self.board[row][column])
-        else:
-            self.mark_field_dangerous(self.board[row][column])
+        self.marked = Frontier()
+        self.board = FieldGrid(self)
+        self.opened = 0
+        self.lost = False
+        self.won = False
 
-    def _left_click(self, event):
-        """
-        Handle left click on the grid.
+    def add_observer(self, observer):
+        self.observers.append(observer)
 
-        If the field we clicked is already opened, do nothing since it makes no sense.
-        """
-        grid_info = event.widget.grid_info()
-        column, row = grid_info["column"], grid_info["row"]
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
 
-        if self.board[row][column].covered:
-            self.open_field(self.board[row][column])
+    def _notify(self, event, *args):
+        for observer in self.observers:
+            getattr(observer, event)(*args)
 
-    def setup_gui(self):
+    def is_over(self):
         """
-        Create and setup objects needed for GUI.
+        Return True if a mine has been opened or all safe fields are opened
         """
-        self.root = tk.Tk()
-        self.root.title("Minesweeper solver")
-
-        self.images = {
-            "covered": tk.PhotoImage(file="images/covered.png").subsample(6, 6),
-            "marked": tk.PhotoImage(file="images/flagged.png").subsample(6, 6),
-            "numbers": [tk.PhotoImage(file="images/{}.png".format(i)).subsample(6, 6) for i in range(8+1)],
-            "bomb": tk.PhotoImage(file="images/bomb.png").subsample(2, 2)
-        }
-
-        # create 2x3 grid for root frame
-        [self.root.rowconfigure(r, weight=1) for r in range(3)]
-        [self.root.columnconfigure(c, weight=1) for c in range(3)]
-
-        self.labels["mines"] = ttk.Label(self.root, text="Mines: {}".format(self.num_mines))
-        self.labels["mines"].grid(row=0, column=0)
-
-        self.labels["alive"] = ttk.Label(self.root, text="Alive")
-        self.labels["alive"].grid(row=0, column=1)
+        return self.lost or self.won
 
-        self.labels["opened"] = ttk.Label(self.root, text="Opened: 0")
-        self.labels["opened"].grid(row=0, column=2)
+    def get_field_by_id(self, id):
+        row, column = divmod(int(id) - 1, self.columns)
+        return Field(self, row, column)
 
-        self.strategy_grid = ttk.Frame(self.root, name="strategy_grid")
-        self.strategy_grid.grid(row=1, column=0, rowspan=1, columnspan=3)
+    def take(self, name, ids):
+        """
+        Return values of the state array name (mines, covered, flags or counts) for numpy
+        array of field ids, like numpy.take on the flattened array.
+        """
+        return getattr(self, name).reshape(-1)[ids - 1]
 
-        CSP_button = ttk.Button(self.strategy_grid, name="csp_button", text="CSP Strategy")
-        CSP_button.grid(row=0, column=0)
-        CSP_button.bind('<ButtonPress-1>', self._run_CSP)
-        SAT_button = ttk.Button(self.strategy_grid, name="sat_button", text="SAT Strategy")
-        SAT_button.grid(row=0, column=1)
-        SAT_button.bind('<ButtonPress-1>', self._run_SAT)
-        next_step = ttk.Button(self.strategy_grid, name="next_step", text="Next step")
-        next_step.grid(row=0, column=2)
-        next_step.bind('<ButtonPress-1>', self._next_step)
-        next_step.config(state=tk.DISABLED)
+    def put(self, name, ids, value):
+        """
+        Set values of the state array name for numpy array of field ids.
+        """
+        getattr(self, name).reshape(-1)[ids - 1] = value
 
-        # create a frame for minesweeper button grid
-        self.grid = ttk.Frame(self.root)
-        self.grid.grid(row=2, column=0, rowspan=1, columnspan=self.board_dim)
+    def _covered_ids(self):
+        """
+        Return numpy array with ids of all covered fields
+        """
+        return np.flatnonzero(self.covered) + 1
 
-        for x in range(self.board_dim):
-            row_buttons = []
-            for y in range(self.board_dim):
-                b = ttk.Button(self.grid, width=2, image=self.images["covered"])
-                b.grid(row=x, column=y)
-                b.bind('<ButtonPress-1>', self._left_click)
-                b.bind('<ButtonPress-3>', self._right_click)
-                b.config(state=tk.DISABLED)
-                row_buttons.append(b)
-            self.buttons.append(row_buttons)
+    def random_covered(self, exclude=(), randint=randint):
+        """
+        Return random covered field whose id is not in exclude, or None if there is none.
+        Strategies pass their own randint, so their moves follow their random seed.
+        """
+        covered = self.covered.reshape(-1).copy()
+        covered[np.array(list(exclude), dtype=int) - 1] = False
+        ids = np.flatnonzero(covered) + 1
+        if not len(ids):
+            return None
+        return self.get_field_by_id(int(ids[randint(0, len(ids) - 1)]))
 
-    def set_mines(self, first_field):
+    def random_position(self):
         """
-        Generate self.num_mines random tuples that represent mine positions
+        Return random (row, column) tuple on the board
         """
-        mines = 0
-        while mines < self.num_mines:
-            x, y = (randrange(0, self.board_dim), randrange(0, self.board_dim))
+        return random_field(self.rng, self.board_dim)
 
-            if first_field != (x, y):
-                mines += 1
-                self.board[x][y].is_mine = True
+    def set_mines(self, first_field, mines=None):
+        """
+        Place exactly self.num_mines mines on distinct random fields, first_field
+        (row, column) is never a mine.
+
+        If mines (boolean n x n array, e.g. a board stored in a corpus) is given,
+        mines are placed there instead.
+        """
+        if mines is None:
+            self.mines.fill(False)
+            self.mines.flat[random_mines(self.rng, self.board_dim, self.num_mines, first_field)] = True
+        else:
+            row, column = first_field
+            assert mines.shape == self.mines.shape and not mines[row, column]
+            np.copyto(self.mines, mines)
+            self.num_mines = int(np.count_nonzero(mines))
         self._update()
 
     def num_closed(self):
         """
         Return number of closed fields on the board
         """
-        return self.board_dim ** 2 - self.opened
+        return self.rows * self.columns - self.opened
 
     def get_adjacent_fields(self, row_index, col_index):
         """
         Get a list of adjacent fields around field specified with row_index and col_index
         """
-        adjacent_fields = []
-        for i in range(max(0, row_index - 1), min(self.board_dim, row_index + 2)):
-            for j in range(max(0, col_index - 1), min(self.board_dim, col_index + 2)):
-                if i != row_index or j != col_index:
-                    adjacent_fields.append(self.board[i][j])
-        return adjacent_fields
+        return [self.get_field_by_id(id) for id in self.neighbours[row_index * self.columns + col_index + 1]]
 
     def get_adjacent_mines(self, row_index, col_index):
         """
         Get number of mines in the adjacent fields.
         """
-        return sum(f.is_mine for f in self.get_adjacent_fields(row_index, col_index))
+        ids = self.neighbours[row_index * self.columns + col_index + 1]
+        return int(np.count_nonzero(self.take("mines", np.array(ids))))
 
     def _update(self):
         """
         For each field that is not marked with is_mine compute number of adjacent mines
         """
-        for (row_index, row) in enumerate(self.board):
-            for (col_index, field) in enumerate(row):
-                field = self.board[row_index][col_index]
-                if not field.is_mine:
-                    field.adjacent_mines = self.get_adjacent_mines(row_index, col_index)
+        counts = neighbour_sum(self.mines)
+        counts[self.mines] = 0
+        self.counts = counts
 
     def mark_field_dangerous(self, field):
         """
@@ -173,11 +344,9 @@ class Minesweeper:
         """
         if field not in self.marked:
             field.marked_mine = True
-            self.marked.append(field)
-            print("Mark field {}".format(field))
-            self.buttons[field.row][field.column].config(image=self.images["marked"])
-
-            self.labels["mines"].config(text="Mines: {}".format(self.num_mines - len(self.marked)))
+            self.marked.add(field)
+            logger.debug("Mark field %s", field)
+            self._notify("field_marked", field)
 
     def mark_field_safe(self, field):
         """
@@ -186,141 +355,82 @@ class Minesweeper:
         if field in self.marked:
             field.marked_mine = False
             self.marked.remove(field)
-            print("Remove mark on field {}".format(field))
-            self.buttons[field.row][field.column].config(image=self.images["covered"])
-
-            self.labels["mines"].config(text="Mines: {}".format(self.num_mines - len(self.marked)))
+            logger.debug("Remove mark on field %s", field)
+            self._notify("field_unmarked", field)
 
     def open_field(self, field):
         """
         Open field and check if there is a mine.
 
-        If there is a bomb this function will create new windows with Game over message.
-        If opened field has no adjacent mines we will open new all of his covered adjacent
-        fields.
-
-        Returns list of newly opened fields
+        Returns list of newly opened fields, see reveal.
         """
-        assert field.covered
-        self.opened += 1
-        field.covered = False
-
-        print("Opening {}".format(field))
-
-        if field.is_mine:
-            self.buttons[field.row][field.column].config(image=self.images["bomb"])
-            self.labels["alive"].config(text="Dead")
-
-            print("Game over.")
-            popup = tk.Toplevel(self.root)
-            popup.wm_title("Lose")
-
-            l = tk.Label(popup, text="Game over")
-            l.grid(row=0, column=0, columnspan=2)
-
-            b1 = ttk.Button(popup, text="Exit", command=quit)
-            b1.grid(row=1, column=0)
-            b2 = ttk.Button(popup, text="Restart", command=lambda: self.restart())
-            b2.grid(row=1, column=1)
-
-        else:
-            # if any of these fields are marked as dangerous we should delete now because
-            # they are obviously not dangerous and mark as safe
-            self.mark_field_safe(field)
-
-            self.labels["opened"].config(text="Opened: {}".format(self.opened))
-            self.buttons[field.row][field.column].config(image=self.images["numbers"][field.adjacent_mines])
-
-            # check if all fields are opened
-            if self.num_closed() == self.num_mines:
-
-                # mark all covered as bombs
-                for row in self.board:
-                    for field in row:
-                        if field.covered:
-                            self.mark_field_dangerous(field)
-
-                print("Game solved.")
-                popup = tk.Toplevel(self.root)
-                popup.wm_title("Win")
+        return [self.get_field_by_id(id) for id in self.reveal(field.row, field.column).opened]
 
-                l = tk.Label(popup, text="Game solved")
-                l.grid(row=0, column=0, columnspan=2)
-
-                b1 = ttk.Button(popup, text="Exit", command=quit)
-                b1.grid(row=1, column=0)
-                b2 = ttk.Button(popup, text="Restart", command=lambda: self.restart())
-                b2.grid(row=1, column=1)
-
-            elif field.adjacent_mines == 0:
-                opened_fields = [field]
-                for adjacent_field in self.get_adjacent_fields(field.row, field.column):
-                    if adjacent_field.covered:
-                        opened_fields += self.open_field(adjacent_field)
-                return opened_fields
-            else:
-                return [field]
+    def reveal(self, row_index, col_index):
+        """
+        Open field (row_index, col_index) and check if there is a mine.
 
-        return [field]
+        If there is a bomb the game is lost and observers are notified.
+        If opened field has no adjacent mines we will open all of his covered adjacent
+        fields, and so on for the whole region of fields without adjacent mines.
+        The region is opened iteratively, so its size is not limited by the recursion limit.
 
-    def _run_CSP(self, event):
-        """
-        CSP button is clicked, we are solving with CSP strategy.
-        We will also disable SAT button since we clicked CSP.
+        Returns Reveal with ids of all newly opened fields and ids of newly opened
+        boundary fields (the ones with adjacent mines).
         """
-        SAT_button = event.widget.winfo_toplevel().nametowidget("strategy_grid.sat_button")
-        SAT_button.config(state=tk.DISABLED)
-        self.enable_buttons(event)
+        start = np.array([row_index * self.columns + col_index + 1])
+        assert self.take("covered", start)[0]
 
-        self.strategy = CSP(self)
-        first_field = (randrange(0, self.board_dim), randrange(0, self.board_dim))
-        self.set_mines(first_field)
+        self.put("covered", start, False)
+        if self.take("mines", start)[0]:
+            self.opened += 1
+            field = self.board[row_index][col_index]
+            logger.debug("Opening %s", field)
+            self._notify("field_opened", field)
 
-        self.strategy.first_step(first_field=first_field)
+            self.lost = True
+            logger.debug("Game over.")
+            self._notify("game_lost", field)
+            return Reveal(start, np.array([], dtype=int))
 
-    def _run_SAT(self, event):
-        """
-        SAT button is clicked, we are solving with SAT strategy.
-        We will also disable CSP button since we clicked SAT.
-        """
-        CSP_button = event.widget.winfo_toplevel().nametowidget("strategy_grid.csp_button")
-        CSP_button.config(state=tk.DISABLED)
-        self.enable_buttons(event)
+        # breadth first search over the region, one whole layer of fields without
+        # adjacent mines is expanded at once
+        opened = [start]
+        counts = [self.take("counts", start)]
+        layer = start if counts[0][0] == 0 else start[:0]
+        while layer.size:
+            adjacent = self.neighbours.adjacent(layer)
+            adjacent = np.unique(adjacent[self.take("covered", adjacent)])
 
-        self.strategy = SAT(self)
-        first_field = (randrange(0, self.board_dim), randrange(0, self.board_dim))
-        self.set_mines(first_field)
+            self.put("covered", adjacent, False)
+            opened.append(adjacent)
+            counts.append(self.take("counts", adjacent))
+            layer = adjacent[counts[-1] == 0]
 
-        self.strategy.first_step(first_field=first_field)
+        opened = np.concatenate(opened)
+        self.opened += len(opened)
+        boundary = opened[np.concatenate(counts) > 0]
 
-    def _next_step(self, event):
-        """
-        Run one step of chosen strategy
-        """
-        self.strategy.step()
+        # if any of these fields are marked as dangerous we should delete now because
+        # they are obviously not dangerous and mark as safe
+        for id in opened[self.take("flags", opened)]:
+            self.mark_field_safe(self.get_field_by_id(id))
 
-    def enable_buttons(self, event):
-        """
-        Enables Next step button and all field buttons in the board.
-        """
-        next_step = event.widget.winfo_toplevel().nametowidget("strategy_grid.next_step")
-        next_step.config(state=tk.NORMAL)
+        if self.observers or logger.isEnabledFor(logging.DEBUG):
+            for id in opened:
+                field = self.get_field_by_id(id)
+                logger.debug("Opening %s", field)
+                self._notify("field_opened", field)
 
-        for row in self.buttons:
-            for button in row:
-                button.config(state=tk.NORMAL)
+        # check if all fields are opened
+        if self.num_closed() == self.num_mines:
 
-    def restart(self):
-        """
-        Restart the game by reseting all the widgets in the root window.
-        """
-        self.root.destroy()
-        self.labels = {}
-        self.marked = []
-        self.board = [[Field(j, i, self.board_dim) for i in range(self.board_dim)] for j in range(self.board_dim)]
-        self.buttons = []
-        self.opened = 0
-        self.strategy = None
+            # mark all covered as bombs
+            for id in self._covered_ids():
+                self.mark_field_dangerous(self.get_field_by_id(id))
 
-        self.setup_gui()
+            self.won = True
+            logger.debug("Game solved.")
+            self._notify("game_won")
 
+        return Reveal(opened, boundary)
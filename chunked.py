@@ -0,0 +1,322 @@
+"""
+Board that is generated lazily in square chunks, for boards too big to keep in memory.
+
+Mines of a chunk are placed when the game or a strategy first touches the chunk or one of
+its neighbours, from a random generator seeded with (seed, chunk row, chunk column), so the
+same seed always gives the same board no matter in which order chunks are touched. Every
+chunk gets round(density * fields) mines. Covered fields, marks and adjacent mine counts
+are kept only for touched chunks.
+
+Boards can be rectangular and as large as ids fit in 64 bits, a game on an effectively
+unbounded board is only over when a mine is opened. Example stress test:
+    python3 chunked.py --rows 20000 --columns 20000 --density 0.15 --steps 2000
+"""
+import argparse
+import logging
+import random
+import time
+from random import randint
+import numpy as np
+from board import FieldGrid, Minesweeper, neighbour_sum
+from frontier import Frontier
+from neighbours import NeighbourTable
+
+logger = logging.getLogger(__name__)
+
+
+class Chunk:
+    """
+    State of one touched chunk, arrays have the shape of the chunk.
+    """
+    __slots__ = ("mines", "covered", "flags", "counts")
+
+    def __init__(self, mines, counts):
+        self.mines = mines
+        self.covered = np.ones(mines.shape, dtype=bool)
+        self.flags = np.zeros(mines.shape, dtype=bool)
+        self.counts = counts
+
+
+class ChunkedView:
+    """
+    One state array (mines, covered, flags or counts) of the whole board, indexed by
+    [row, column] like the numpy arrays of Minesweeper, so Field works unchanged.
+    """
+    __slots__ = ("game", "name")
+
+    def __init__(self, game, name):
+        self.game = game
+        self.name = name
+
+    def __getitem__(self, position):
+        row, column = position
+        size = self.game.chunk_size
+        chunk = self.game.chunk((row // size, column // size))
+        return getattr(chunk, self.name)[row % size, column % size]
+
+    def __setitem__(self, position, value):
+        row, column = position
+        size = self.game.chunk_size
+        chunk = self.game.chunk((row // size, column // size))
+        getattr(chunk, self.name)[row % size, column % size] = value
+
+
+class ChunkedMinesweeper(Minesweeper):
+    def __init__(self, rows, columns, density, seed=None, chunk_size=64):
+        """
+        Create rows x columns board where every field is a mine with probability density.
+        Nothing is generated until the board is touched.
+        """
+        if not 0 < density < 1:
+            raise ValueError("Density must be between 0 and 1")
+        self.rows = rows
+        self.columns = columns
+        # number of columns, used for field ids like on square boards
+        self.board_dim = columns
+        self.density = density
+        self.chunk_size = chunk_size
+        self.chunk_rows = -(-rows // chunk_size)
+        self.chunk_columns = -(-columns // chunk_size)
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        # chunks use (seed, chunk row, chunk column), so this stream is separate from theirs
+        self.rng = np.random.default_rng([self.seed])
+        self.num_mines = self._total_mines()
+        self.neighbours = NeighbourTable(rows, columns)
+        self.observers = []
+        self.reset()
+
+    def _chunk_mines(self, height, width):
+        return round(self.density * height * width)
+
+    def _total_mines(self):
+        """
+        Number of mines on the whole board, chunks on the last row and column may be smaller.
+        """
+        size = self.chunk_size
+        last_height = self.rows - (self.chunk_rows - 1) * size
+        last_width = self.columns - (self.chunk_columns - 1) * size
+        total = 0
+        for (rows, height) in ((self.chunk_rows - 1, size), (1, last_height)):
+            for (columns, width) in ((self.chunk_columns - 1, size), (1, last_width)):
+                total += rows * columns * self._chunk_mines(height, width)
+        return total
+
+    def reset(self):
+        """
+        Put the board into its initial state: all fields covered and no chunk generated.
+        """
+        # key (chunk row, chunk column) -> boolean mines array, also for chunks only
+        # generated to count mines next to a touched chunk
+        self._mines = {}
+        # key -> Chunk for touched chunks
+        self._chunks = {}
+        self.first_field = None
+
+        self.mines = ChunkedView(self, "mines")
+        self.covered = ChunkedView(self, "covered")
+        self.flags = ChunkedView(self, "flags")
+        self.counts = ChunkedView(self, "counts")
+
+        self.marked = Frontier()
+        self.board = FieldGrid(self)
+        self.opened = 0
+        self.lost = False
+        self.won = False
+
+    def chunk_mines(self, key):
+        """
+        Return boolean array with mines of the chunk, generating them on first use.
+        """
+        mines = self._mines.get(key)
+        if mines is None:
+            chunk_row, chunk_column = key
+            size = self.chunk_size
+            height = min(size, self.rows - chunk_row * size)
+            width = min(size, self.columns - chunk_column * size)
+            rng = np.random.default_rng([self.seed, chunk_row, chunk_column])
+            mines = np.zeros(height * width, dtype=bool)
+            mines[rng.choice(height * width, size=self._chunk_mines(height, width), replace=False)] = True
+            mines = mines.reshape(height, width)
+
+            # first opened field is never a mine
+            if self.first_field is not None:
+                row, column = self.first_field
+                if (row // size, column // size) == key and mines[row % size, column % size]:
+                    mines[row % size, column % size] = False
+                    self.num_mines -= 1
+            self._mines[key] = mines
+        return mines
+
+    def chunk(self, key):
+        """
+        Return Chunk with the state of a touched chunk, generating it on first use.
+        """
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk_row, chunk_column = key
+            if not (0 <= chunk_row < self.chunk_rows and 0 <= chunk_column < self.chunk_columns):
+                raise IndexError("position outside of the board")
+            mines = self.chunk_mines(key)
+            height, width = mines.shape
+
+            # mines of the chunk with a border of one field taken from the adjacent chunks
+            padded = np.zeros((height + 2, width + 2), dtype=np.int8)
+            for i in (-1, 0, 1):
+                for j in (-1, 0, 1):
+                    other = (chunk_row + i, chunk_column + j)
+                    if not (0 <= other[0] < self.chunk_rows and 0 <= other[1] < self.chunk_columns):
+                        continue
+                    other_mines = self.chunk_mines(other)
+                    rows = slice(0, 1) if i == -1 else slice(1, height + 1) if i == 0 else slice(height + 1, height + 2)
+                    columns = slice(0, 1) if j == -1 else slice(1, width + 1) if j == 0 else slice(width + 1, width + 2)
+                    source_rows = slice(-1, None) if i == -1 else slice(None) if i == 0 else slice(0, 1)
+                    source_columns = slice(-1, None) if j == -1 else slice(None) if j == 0 else slice(0, 1)
+                    padded[rows, columns] = other_mines[source_rows, source_columns]
+
+            counts = neighbour_sum(padded, padded=True)
+            counts[mines] = 0
+            chunk = self._chunks[key] = Chunk(mines, counts)
+        return chunk
+
+    def touched_chunks(self):
+        return len(self._chunks)
+
+    def _groups(self, ids):
+        """
+        Generate (chunk, positions in ids, rows and columns inside the chunk) for every
+        chunk that has some of the fields in numpy array ids.
+        """
+        size = self.chunk_size
+        rows, columns = np.divmod(ids - 1, self.columns)
+        keys = (rows // size) * self.chunk_columns + columns // size
+        order = np.argsort(keys, kind="stable")
+        unique, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for (key, start, end) in zip(unique.tolist(), starts, ends):
+            positions = order[start:end]
+            chunk = self.chunk(divmod(key, self.chunk_columns))
+            yield chunk, positions, rows[positions] % size, columns[positions] % size
+
+    def take(self, name, ids):
+        result = None
+        for (chunk, positions, rows, columns) in self._groups(ids):
+            values = getattr(chunk, name)
+            if result is None:
+                result = np.empty(len(ids), dtype=values.dtype)
+            result[positions] = values[rows, columns]
+        if result is None:
+            result = np.empty(0, dtype=np.int8 if name == "counts" else bool)
+        return result
+
+    def put(self, name, ids, value):
+        for (chunk, positions, rows, columns) in self._groups(ids):
+            getattr(chunk, name)[rows, columns] = value
+
+    def _covered_ids(self):
+        ids = []
+        for chunk_row in range(self.chunk_rows):
+            for chunk_column in range(self.chunk_columns):
+                chunk = self.chunk((chunk_row, chunk_column))
+                rows, columns = np.nonzero(chunk.covered)
+                rows += chunk_row * self.chunk_size
+                columns += chunk_column * self.chunk_size
+                ids.append(rows * self.columns + columns + 1)
+        return np.concatenate(ids)
+
+    def random_position(self):
+        row = int(self.rng.integers(0, self.rows))
+        column = int(self.rng.integers(0, self.columns))
+        return row, column
+
+    def random_covered(self, exclude=(), randint=randint):
+        """
+        Return random covered field whose id is not in exclude. Fields are sampled from the
+        touched chunks, so guesses stay next to the part of the board already played, and
+        from the whole board if the touched chunks have no such field.
+        """
+        exclude = set(exclude)
+        keys = list(self._chunks)
+        for _ in range(64):
+            if keys:
+                chunk_row, chunk_column = keys[randint(0, len(keys) - 1)]
+                mines = self._mines[(chunk_row, chunk_column)]
+                row = chunk_row * self.chunk_size + randint(0, mines.shape[0] - 1)
+                column = chunk_column * self.chunk_size + randint(0, mines.shape[1] - 1)
+            else:
+                row, column = randint(0, self.rows - 1), randint(0, self.columns - 1)
+            field = self.board[row][column]
+            if field.covered and field.id not in exclude:
+                return field
+
+        # touched chunks are (almost) done, look for any other field
+        for key in keys:
+            rows, columns = np.nonzero(self._chunks[key].covered)
+            ids = (rows + key[0] * self.chunk_size) * self.columns + columns + key[1] * self.chunk_size + 1
+            ids = [id for id in ids.tolist() if id not in exclude]
+            if ids:
+                return self.get_field_by_id(ids[randint(0, len(ids) - 1)])
+        for _ in range(64):
+            field = self.board[randint(0, self.rows - 1)][randint(0, self.columns - 1)]
+            if field.covered and field.id not in exclude:
+                return field
+        return None
+
+    def set_mines(self, first_field, mines=None):
+        """
+        Start the game with first_field (row, column), which is never a mine. Mines are
+        placed lazily, stored boards are not supported.
+        """
+        if mines is not None:
+            raise ValueError("Chunked board places its own mines")
+        if self._mines:
+            self.reset()
+            self.num_mines = self._total_mines()
+        self.first_field = first_field
+        row, column = first_field
+        self.chunk_mines((row // self.chunk_size, column // self.chunk_size))
+
+    def memory(self):
+        """
+        Return number of bytes used by the generated chunks
+        """
+        return sum(mines.nbytes for mines in self._mines.values()) + \
+            sum(chunk.covered.nbytes + chunk.flags.nbytes + chunk.counts.nbytes for chunk in self._chunks.values())
+
+
+def main(argv=None):
+    from strategy import STRATEGIES
+
+    parser = argparse.ArgumentParser(description="Play a strategy on a huge lazily generated board.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--columns", type=int, default=10000)
+    parser.add_argument("--density", type=float, default=0.15)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="SAT")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    game = ChunkedMinesweeper(args.rows, args.columns, args.density, seed=args.seed, chunk_size=args.chunk_size)
+    strategy = STRATEGIES[args.strategy](game)
+
+    start = time.perf_counter()
+    first_field = game.random_position()
+    game.set_mines(first_field)
+    strategy.first_step(first_field=first_field)
+    steps = 0
+    while not game.is_over() and steps < args.steps:
+        strategy.step()
+        steps += 1
+    elapsed = time.perf_counter() - start
+
+    print("steps: {}, lost: {}, opened: {}, frontier: {}".format(
+        steps, game.lost, game.opened, len(strategy.constraints.frontier)))
+    print("time: {:.2f} s, {:.2f} ms per step, guesses: {}".format(
+        elapsed, 1000 * elapsed / max(steps, 1), strategy.metrics.counters.get("guesses", 0)))
+    print("chunks touched: {}, memory: {:.1f} MB for {} fields".format(
+        game.touched_chunks(), game.memory() / 1e6, game.rows * game.columns))
+
+
+if __name__ == "__main__":
+    main()
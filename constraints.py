@@ -0,0 +1,152 @@
+from collections import namedtuple
+from frontier import Frontier
+
+# exactly `mines` of the covered fields with ids in `cells` (frozenset) are mines
+Constraint = namedtuple("Constraint", ["cells", "mines"])
+
+# independent part of the problem: covered fields (tuple of ids) connected through
+# shared constraints, and the constraints on them (frozenset, also used as cache key)
+Component = namedtuple("Component", ["cells", "constraints"])
+
+
+class ConstraintSet:
+    """
+    Constraints that opened boundary fields put on their covered neighbours.
+
+    Constraints are kept reduced: fields with known value are substituted out, so only
+    fields that are still unknown appear in them. Every field is identified by Field.id.
+    """
+
+    def __init__(self):
+        # id of opened field -> its Constraint
+        self.constraints = {}
+        # id of covered field -> ids of opened fields that constrain it, in insertion order
+        # so the frontier is iterated deterministically
+        self.frontier = {}
+        self.mines = Frontier()
+        # fields proven safe that are not opened yet
+        self.safe = Frontier()
+        # ids of opened fields whose constraints changed since the last propagate
+        self.dirty = Frontier()
+
+    def add(self, source, cells, mines):
+        """
+        Add constraint of opened field with id source: exactly mines of cells are mines.
+        """
+        cells = [cell for cell in cells if cell not in self.safe]
+        known = sum(cell in self.mines for cell in cells)
+        constraint = Constraint(frozenset(cell for cell in cells if cell not in self.mines), mines - known)
+        if constraint.cells:
+            self.constraints[source] = constraint
+            self.dirty.add(source)
+            for cell in constraint.cells:
+                self.frontier.setdefault(cell, Frontier()).add(source)
+        return constraint
+
+    def resolve(self, cell, is_mine):
+        """
+        Value of the field is known, substitute it out of all constraints.
+        """
+        if is_mine:
+            self.mines.add(cell)
+        else:
+            self.safe.add(cell)
+
+        for source in self.frontier.pop(cell, ()):
+            constraint = self.constraints[source]
+            cells = constraint.cells - {cell}
+            if cells:
+                self.constraints[source] = Constraint(cells, constraint.mines - is_mine)
+                self.dirty.add(source)
+            else:
+                del self.constraints[source]
+
+    def open(self, cell):
+        """
+        Field was opened, it is safe and no longer unknown.
+        """
+        self.resolve(cell, False)
+        self.safe.discard(cell)
+
+    def components(self):
+        """
+        Split the frontier into components of fields connected through shared constraints.
+        """
+        parent = {cell: cell for cell in self.frontier}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for constraint in self.constraints.values():
+            cells = iter(constraint.cells)
+            root = find(next(cells))
+            for cell in cells:
+                other = find(cell)
+                if other != root:
+                    parent[other] = root
+
+        cells = {}
+        for cell in self.frontier:
+            cells.setdefault(find(cell), []).append(cell)
+        constraints = {root: set() for root in cells}
+        for constraint in self.constraints.values():
+            constraints[find(next(iter(constraint.cells)))].add(constraint)
+
+        return [Component(tuple(cells[root]), frozenset(constraints[root])) for root in cells]
+
+    def propagate(self):
+        """
+        Find fields whose value follows directly from the constraints and substitute them out,
+        until nothing more can be found. Two rules are used:
+
+        - saturation: constraint with 0 mines has all fields safe, constraint with as many mines
+          as fields has all fields mines
+        - difference: for constraints A and B sharing fields, if A has |A \\ B| more mines than B,
+          all fields in A \\ B are mines and all fields in B \\ A are safe (this includes subsets)
+
+        Only constraints changed since the last call are checked, pairs of unchanged
+        constraints were already checked before.
+
+        Returns lists of ids of fields found to be mines and safe.
+        """
+        mines, safe = [], []
+        while self.dirty:
+            dirty = [self.constraints[source] for source in self.dirty if source in self.constraints]
+
+            found = {}
+            for constraint in dirty:
+                if constraint.mines == 0:
+                    found.update(dict.fromkeys(constraint.cells, False))
+                elif constraint.mines == len(constraint.cells):
+                    found.update(dict.fromkeys(constraint.cells, True))
+
+            if not found:
+                for a, b in self._overlapping(dirty):
+                    if a.mines - b.mines == len(a.cells - b.cells):
+                        found.update(dict.fromkeys(a.cells - b.cells, True))
+                        found.update(dict.fromkeys(b.cells - a.cells, False))
+                # all changed constraints are checked now
+                self.dirty.clear()
+
+            for cell, is_mine in found.items():
+                self.resolve(cell, is_mine)
+                (mines if is_mine else safe).append(cell)
+        return mines, safe
+
+    def _overlapping(self, constraints):
+        """
+        Generate pairs (a, b) and (b, a) for every constraint a in the list and every
+        constraint b that shares at least one field with it.
+        """
+        for constraint in constraints:
+            others = set()
+            for cell in constraint.cells:
+                others.update(self.frontier[cell])
+            for other in others:
+                other = self.constraints[other]
+                if other is not constraint:
+                    yield constraint, other
+                    yield other, constraint
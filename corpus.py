@@ -0,0 +1,167 @@
+"""
+Corpus of stored boards in a compact binary file.
+
+All boards in a file have the same size and number of mines. The file has a fixed header
+followed by fixed size records, so it can be memory-mapped and the i-th board is read
+directly from its offset:
+
+    header: magic b"MSWC", version (u16), board_dim (u16), num_mines (u32), count (u64),
+            padded to 32 bytes
+    record: seed (u64), first click as field index row * board_dim + column (u32),
+            mine bitmap packed 8 fields per byte in row-major order (np.packbits)
+
+All numbers are little endian. Example:
+    python3 corpus.py boards.msw --size 16 --mines 40 --boards 1000000
+"""
+import argparse
+from collections import namedtuple
+import numpy as np
+from board import Minesweeper, seeded_board
+
+MAGIC = b"MSWC"
+VERSION = 1
+
+HEADER = np.dtype([("magic", "S4"), ("version", "<u2"), ("board_dim", "<u2"), ("num_mines", "<u4"),
+                   ("count", "<u8"), ("reserved", "V12")])
+
+# one stored board: seed of the game, first click (row, column) and boolean n x n mines array
+Board = namedtuple("Board", ["seed", "first_field", "mines"])
+
+
+def record_dtype(board_dim):
+    return np.dtype([("seed", "<u8"), ("first", "<u4"), ("mines", "u1", ((board_dim ** 2 + 7) // 8,))])
+
+
+class CorpusWriter:
+    """
+    Write boards to a corpus file. Records are buffered and written in blocks, the number of
+    boards in the header is written when the writer is closed.
+    """
+
+    def __init__(self, path, board_dim, num_mines, buffer_size=4096):
+        self.board_dim = board_dim
+        self.num_mines = num_mines
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(self._header().tobytes())
+        self.buffer = np.zeros(buffer_size, dtype=record_dtype(board_dim))
+        self.buffered = 0
+
+    def _header(self):
+        header = np.zeros(1, dtype=HEADER)
+        header[0] = (MAGIC, VERSION, self.board_dim, self.num_mines, self.count, b"")
+        return header
+
+    def write(self, mines, first_field, seed=0):
+        """
+        Add board with mines (boolean n x n array) and first click (row, column).
+        """
+        assert mines.shape == (self.board_dim, self.board_dim)
+        row, column = first_field
+        record = self.buffer[self.buffered]
+        record["seed"] = seed
+        record["first"] = row * self.board_dim + column
+        record["mines"] = np.packbits(mines.reshape(-1))
+        self.buffered += 1
+        self.count += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.buffer[:self.buffered].tofile(self.file)
+        self.buffered = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.seek(0)
+        self.file.write(self._header().tobytes())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class Corpus:
+    """
+    Read-only view of a corpus file. Records are memory-mapped, so opening the file does not
+    read the boards and many processes can share the same pages.
+    """
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) != 1 or header["magic"][0] != MAGIC:
+            raise ValueError("{} is not a board corpus".format(path))
+        if header["version"][0] != VERSION:
+            raise ValueError("Unsupported corpus version {}".format(header["version"][0]))
+
+        self.path = path
+        self.board_dim = int(header["board_dim"][0])
+        self.num_mines = int(header["num_mines"][0])
+        count = int(header["count"][0])
+        self.records = np.memmap(path, dtype=record_dtype(self.board_dim), mode="r",
+                                 offset=HEADER.itemsize, shape=(count,)) if count else \
+            np.zeros(0, dtype=record_dtype(self.board_dim))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        n = self.board_dim
+        first = int(record["first"])
+        mines = np.unpackbits(record["mines"], count=n * n).reshape(n, n).view(bool)
+        return Board(int(record["seed"]), (first // n, first % n), mines)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def mines(self, start=0, stop=None):
+        """
+        Return boolean array (boards, n, n) with mines of boards start..stop, unpacked at once.
+        """
+        n = self.board_dim
+        packed = self.records["mines"][start:stop]
+        return np.unpackbits(packed, axis=1, count=n * n).reshape(-1, n, n).view(bool)
+
+    def game(self, index):
+        """
+        Return new Minesweeper with the index-th board and the board's first click.
+        Mines are already set, the first click is not opened yet.
+        """
+        board = self[index]
+        game = Minesweeper(self.board_dim, self.num_mines, seed=board.seed)
+        game.set_mines(board.first_field, board.mines)
+        return game, board.first_field
+
+
+def generate(path, board_dim, num_mines, count, seed=0):
+    """
+    Write count random boards with seeds seed, seed + 1, ... The boards are the same as
+    the ones Minesweeper(board_dim, num_mines, seed) creates with random_position and set_mines.
+    """
+    with CorpusWriter(path, board_dim, num_mines) as writer:
+        for board_seed in range(seed, seed + count):
+            first_field, mines = seeded_board(board_dim, num_mines, board_seed)
+            writer.write(mines, first_field, board_seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a corpus of random Minesweeper boards.")
+    parser.add_argument("path")
+    parser.add_argument("--size", type=int, default=16)
+    parser.add_argument("--mines", type=int, default=40)
+    parser.add_argument("--boards", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first board, next boards use seed+1, ...")
+    args = parser.parse_args(argv)
+    generate(args.path, args.size, args.mines, args.boards, args.seed)
+
+
+if __name__ == "__main__":
+    main()
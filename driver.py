@@ -1,5 +1,78 @@
+"""
+Command line entry point: play in the GUI or let a strategy play without a display.
+
+Examples:
+    python3 driver.py --size 16 --mines 40
+    python3 driver.py --headless --strategy SAT --size 16 --mines 40 --seed 1 --games 10
+
+Only the modules needed by the chosen mode are imported: tkinter only for the GUI, and the
+cassowary or pysat backend only when its strategy is created.
+"""
+import argparse
+import random
+import sys
+import time
 from board import Minesweeper
+from strategy import STRATEGIES
+
+
+def play(args):
+    """
+    Play args.games seeded games headless and print a line for every game and a summary.
+    """
+    wins = 0
+    start = time.perf_counter()
+    for seed in range(args.seed, args.seed + args.games):
+        # strategies choose moves with the random module
+        random.seed(seed)
+        game_start = time.perf_counter()
+        strategy = STRATEGIES[args.strategy](Minesweeper(args.size, args.mines, seed=seed))
+        won = strategy.play()
+        wins += won
+        print("game {}: {}, {} steps, {} guesses, {:.3f} s".format(
+            seed, "won" if won else "lost", strategy.metrics.counters.get("steps", 0),
+            strategy.metrics.counters.get("guesses", 0), time.perf_counter() - game_start))
+    if args.games:
+        print("won {} of {} games in {:.2f} s".format(wins, args.games, time.perf_counter() - start))
+    return wins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Minesweeper or watch a strategy solve it.")
+    parser.add_argument("--size", type=int, default=4, help="number of rows and columns")
+    parser.add_argument("--mines", type=int, default=3)
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES),
+                        help="strategy to play with (headless default: SAT, GUI default: chosen with the buttons)")
+    parser.add_argument("--seed", type=int, help="seed of the board and of the strategy's moves")
+    parser.add_argument("--headless", action="store_true", help="play without GUI and print the results")
+    parser.add_argument("--games", type=int, default=1, help="number of headless games, seeds seed, seed+1, ...")
+    args = parser.parse_args(argv)
+    if args.size < 1:
+        parser.error("size must be at least 1")
+    if args.mines < 0:
+        parser.error("number of mines can not be negative")
+    if args.mines >= args.size ** 2:
+        parser.error("there must be fewer mines than fields")
+
+    if args.headless:
+        if args.strategy is None:
+            args.strategy = "SAT"
+        if args.seed is None:
+            args.seed = random.randrange(2 ** 32)
+        play(args)
+        return
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    from gui import MinesweeperGUI
+
+    gui = MinesweeperGUI(Minesweeper(args.size, args.mines, seed=args.seed))
+    if args.strategy == "CSP":
+        gui._run_CSP(None)
+    elif args.strategy == "SAT":
+        gui._run_SAT(None)
+    gui.root.mainloop()
+
 
 if __name__ == "__main__":
-    b = Minesweeper(4, 3)
-    b.root.mainloop()
+    sys.exit(main())
@@ -0,0 +1,41 @@
+class Frontier:
+    """
+    Ordered set of fields (or any hashable items) with O(1) membership, insertion and removal.
+
+    Items are iterated in the order they were added, so strategies that walk over the
+    frontier make the same moves for the same game. Backed by a dict, which keeps
+    insertion order.
+    """
+
+    def __init__(self, items=()):
+        self._items = dict.fromkeys(items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return "Frontier({})".format(list(self._items))
+
+    def add(self, item):
+        self._items[item] = None
+
+    def remove(self, item):
+        del self._items[item]
+
+    def discard(self, item):
+        self._items.pop(item, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def snapshot(self):
+        """
+        Return items as a list, for iterating while the frontier is changed.
+        """
+        return list(self._items)
@@ -0,0 +1,359 @@
+import queue
+import tkinter as tk
+from tkinter import ttk
+from autoplay import AutoPlayer
+from board import GameObserver
+from strategy import CSP, SAT
+
+# time between two redraws of the board in ms, changed fields are drawn in one batch per frame
+FRAME_MS = 16
+
+# largest size of the visible part of the board in pixels, bigger boards are scrolled
+MAX_VIEW = 800
+
+# default number of moves per second in run mode
+RATE = 10
+
+# PhotoImages for every subsample factor, loaded once per process
+IMAGES = {}
+
+
+def load_images(factor):
+    """
+    Return images for fields subsampled by the given factor, the png files are read only
+    the first time the factor is used.
+    """
+    images = IMAGES.get(factor)
+    if images is None:
+        # bomb image is 48px while the others are 200px
+        bomb = max(1, factor // 3)
+        images = IMAGES[factor] = {
+            "covered": tk.PhotoImage(file="images/covered.png").subsample(factor, factor),
+            "marked": tk.PhotoImage(file="images/flagged.png").subsample(factor, factor),
+            "numbers": [tk.PhotoImage(file="images/{}.png".format(i)).subsample(factor, factor) for i in range(8+1)],
+            "bomb": tk.PhotoImage(file="images/bomb.png").subsample(bomb, bomb)
+        }
+    return images
+
+
+class MinesweeperGUI(GameObserver):
+    def __init__(self, game):
+        """
+        Create tkinter window for the game object and follow its changes.
+        """
+        self.game = game
+        self.labels = {}
+        self.strategy = None
+        self.player = None
+        self.popup = None
+
+        # ids of changed fields and "lost"/"won"/"stopped" events, waiting for the next frame,
+        # filled from the Tk thread as well as from the auto play worker
+        self.events = queue.SimpleQueue()
+
+        self.game.add_observer(self)
+        self.setup_gui()
+
+    def _cell(self, event):
+        """
+        Return field under the mouse pointer, or None if the click was outside the board.
+        """
+        row = int(self.canvas.canvasy(event.y)) // self.cell_size
+        column = int(self.canvas.canvasx(event.x)) // self.cell_size
+        if 0 <= row < self.game.board_dim and 0 <= column < self.game.board_dim:
+            return self.game.board[row][column]
+        return None
+
+    def _right_click(self, event):
+        """
+        Handle right click on the board
+        If the field is marked as mine, we are removing the mark and vice versa.
+        """
+        field = self._cell(event)
+        if self.strategy is None or field is None or not field.covered:
+            return
+
+        # the click is ignored while the solver is making a move
+        if not self.player.lock.acquire(blocking=False):
+            return
+        try:
+            if field.marked_mine:
+                self.game.mark_field_safe(field)
+            else:
+                self.game.mark_field_dangerous(field)
+        finally:
+            self.player.lock.release()
+
+    def _left_click(self, event):
+        """
+        Handle left click on the board.
+
+        If the field we clicked is already opened, do nothing since it makes no sense.
+        The field is opened through the strategy, so its constraints know about the field
+        and the next move uses the fields opened by the click.
+        """
+        field = self._cell(event)
+        if self.strategy is None or field is None or self.game.is_over():
+            return
+
+        if not self.player.lock.acquire(blocking=False):
+            return
+        try:
+            if field.covered and not self.game.is_over():
+                self.strategy.newly_opened += self.strategy.open(field)
+        finally:
+            self.player.lock.release()
+
+    def setup_gui(self):
+        """
+        Create and setup objects needed for GUI.
+        """
+        self.root = tk.Tk()
+        self.root.title("Minesweeper solver")
+
+        # fields are 34px on small boards and 20px on big ones
+        self.images = load_images(6 if self.game.board_dim <= 30 else 10)
+        self.cell_size = self.images["covered"].width()
+
+        # create 2x3 grid for root frame
+        [self.root.rowconfigure(r, weight=1) for r in range(3)]
+        [self.root.columnconfigure(c, weight=1) for c in range(3)]
+
+        self.labels["mines"] = ttk.Label(self.root, text="Mines: {}".format(self.game.num_mines))
+        self.labels["mines"].grid(row=0, column=0)
+
+        self.labels["alive"] = ttk.Label(self.root, text="Alive")
+        self.labels["alive"].grid(row=0, column=1)
+
+        self.labels["opened"] = ttk.Label(self.root, text="Opened: 0")
+        self.labels["opened"].grid(row=0, column=2)
+
+        self.strategy_grid = ttk.Frame(self.root, name="strategy_grid")
+        self.strategy_grid.grid(row=1, column=0, rowspan=1, columnspan=3)
+
+        CSP_button = ttk.Button(self.strategy_grid, name="csp_button", text="CSP Strategy")
+        CSP_button.grid(row=0, column=0)
+        CSP_button.bind('<ButtonPress-1>', self._run_CSP)
+        SAT_button = ttk.Button(self.strategy_grid, name="sat_button", text="SAT Strategy")
+        SAT_button.grid(row=0, column=1)
+        SAT_button.bind('<ButtonPress-1>', self._run_SAT)
+        next_step = ttk.Button(self.strategy_grid, name="next_step", text="Next step")
+        next_step.grid(row=0, column=2)
+        next_step.bind('<ButtonPress-1>', self._next_step)
+        next_step.config(state=tk.DISABLED)
+        run = ttk.Button(self.strategy_grid, name="run", text="Run", command=self._toggle_run)
+        run.grid(row=0, column=3)
+        run.config(state=tk.DISABLED)
+        cancel = ttk.Button(self.strategy_grid, name="cancel", text="Cancel", command=self._cancel)
+        cancel.grid(row=0, column=4)
+        cancel.config(state=tk.DISABLED)
+
+        self.rate = tk.Scale(self.strategy_grid, name="rate", label="Moves/s", from_=1, to=200,
+                             orient=tk.HORIZONTAL, command=self._set_rate)
+        self.rate.set(RATE)
+        self.rate.grid(row=0, column=5)
+
+        # the whole board is drawn on one canvas, with one image item per field
+        self.grid = ttk.Frame(self.root)
+        self.grid.grid(row=2, column=0, rowspan=1, columnspan=3, sticky="nsew")
+        self.grid.rowconfigure(0, weight=1)
+        self.grid.columnconfigure(0, weight=1)
+
+        size = self.cell_size * self.game.board_dim
+        view = min(size, MAX_VIEW)
+        self.canvas = tk.Canvas(self.grid, width=view, height=view, highlightthickness=0,
+                                scrollregion=(0, 0, size, size))
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        if size > view:
+            x_scroll = ttk.Scrollbar(self.grid, orient=tk.HORIZONTAL, command=self.canvas.xview)
+            x_scroll.grid(row=1, column=0, sticky="ew")
+            y_scroll = ttk.Scrollbar(self.grid, orient=tk.VERTICAL, command=self.canvas.yview)
+            y_scroll.grid(row=0, column=1, sticky="ns")
+            self.canvas.config(xscrollcommand=x_scroll.set, yscrollcommand=y_scroll.set)
+
+        # canvas item of the field with id i is at index i - 1
+        half = self.cell_size // 2
+        self.items = [self.canvas.create_image(column * self.cell_size + half, row * self.cell_size + half,
+                                               image=self.images["covered"], tags="field")
+                      for row in range(self.game.board_dim) for column in range(self.game.board_dim)]
+
+        self.canvas.bind('<ButtonPress-1>', self._left_click)
+        self.canvas.bind('<ButtonPress-3>', self._right_click)
+
+        self.root.after(FRAME_MS, self.redraw)
+
+    def field_image(self, field):
+        """
+        Image for the current state of the field.
+        """
+        if field.marked_mine:
+            return self.images["marked"]
+        if field.covered:
+            return self.images["covered"]
+        if field.is_mine:
+            return self.images["bomb"]
+        return self.images["numbers"][field.adjacent_mines]
+
+    def redraw(self):
+        """
+        Draw all fields changed since the last frame and update the labels, then schedule
+        the next frame. Every field is drawn once per frame, no matter how many times it changed.
+        """
+        dirty = set()
+        ended = None
+        stopped = False
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == "stopped":
+                stopped = True
+            elif isinstance(event, str):
+                ended = event
+            else:
+                dirty.add(event)
+
+        if dirty:
+            for id in dirty:
+                self.canvas.itemconfigure(self.items[id - 1], image=self.field_image(self.game.get_field_by_id(id)))
+            self.labels["opened"].config(text="Opened: {}".format(self.game.opened))
+            self.labels["mines"].config(text="Mines: {}".format(self.game.num_mines - len(self.game.marked)))
+
+        if ended == "lost":
+            self.labels["alive"].config(text="Dead")
+            self._popup("Lose", "Game over")
+        elif ended == "won":
+            self._popup("Win", "Game solved")
+        if stopped:
+            self.set_controls(tk.DISABLED)
+
+        self.root.after(FRAME_MS, self.redraw)
+
+    def field_opened(self, field):
+        self.events.put(field.id)
+
+    def field_marked(self, field):
+        self.events.put(field.id)
+
+    def field_unmarked(self, field):
+        self.events.put(field.id)
+
+    def game_lost(self, field):
+        self.events.put("lost")
+
+    def game_won(self):
+        self.events.put("won")
+
+    def _popup(self, title, message):
+        """
+        Create new window with the message and Exit/Restart buttons.
+        """
+        self.popup = popup = tk.Toplevel(self.root)
+        popup.wm_title(title)
+
+        l = tk.Label(popup, text=message)
+        l.grid(row=0, column=0, columnspan=2)
+
+        b1 = ttk.Button(popup, text="Exit", command=quit)
+        b1.grid(row=1, column=0)
+        b2 = ttk.Button(popup, text="Restart", command=lambda: self.restart())
+        b2.grid(row=1, column=1)
+
+    def _run_CSP(self, event):
+        """
+        CSP button is clicked, we are solving with CSP strategy.
+        We will also disable SAT button since we clicked CSP.
+        """
+        if self.strategy is None:
+            self.strategy_grid.nametowidget("sat_button").config(state=tk.DISABLED)
+            self._start(CSP(self.game))
+
+    def _run_SAT(self, event):
+        """
+        SAT button is clicked, we are solving with SAT strategy.
+        We will also disable CSP button since we clicked SAT.
+        """
+        if self.strategy is None:
+            self.strategy_grid.nametowidget("csp_button").config(state=tk.DISABLED)
+            self._start(SAT(self.game))
+
+    def _start(self, strategy):
+        """
+        Make the first move and start the auto play worker paused, all further moves
+        of the strategy are made by the worker.
+        """
+        self.strategy = strategy
+        first_field = self.game.random_position()
+        self.game.set_mines(first_field)
+        self.strategy.first_step(first_field=first_field)
+
+        self.player = AutoPlayer(self.strategy, rate=self.rate.get(),
+                                 on_finish=lambda: self.events.put("stopped")).start()
+        self.set_controls(tk.NORMAL)
+
+    def _next_step(self, event):
+        """
+        Run one step of chosen strategy
+        """
+        if self.player is not None and self.player.paused:
+            self.player.step()
+
+    def _toggle_run(self):
+        """
+        Switch between continuous play and single steps.
+        """
+        run = self.strategy_grid.nametowidget("run")
+        if self.player.paused:
+            self.player.resume()
+            run.config(text="Pause")
+            self.strategy_grid.nametowidget("next_step").config(state=tk.DISABLED)
+        else:
+            self.player.pause()
+            run.config(text="Run")
+            self.strategy_grid.nametowidget("next_step").config(state=tk.NORMAL)
+
+    def _cancel(self):
+        """
+        Stop the solver after its current move, the board can still be played by hand.
+        """
+        self.player.cancel(wait=False)
+
+    def _set_rate(self, value):
+        if self.player is not None:
+            self.player.set_rate(float(value))
+
+    def set_controls(self, state):
+        """
+        Enable or disable Next step, Run and Cancel buttons.
+        """
+        for name in ("next_step", "run", "cancel"):
+            self.strategy_grid.nametowidget(name).config(state=state)
+        self.strategy_grid.nametowidget("run").config(text="Run")
+
+    def restart(self):
+        """
+        Restart the game by reseting the board and redrawing the canvas, the window
+        and the loaded images are reused.
+        """
+        if self.popup is not None:
+            self.popup.destroy()
+            self.popup = None
+        # the worker must not touch the game while it is reset
+        if self.player is not None:
+            self.player.cancel()
+            self.player = None
+        self.game.reset()
+        self.strategy = None
+
+        # drop events of the previous game and cover all fields at once
+        while not self.events.empty():
+            self.events.get_nowait()
+        self.canvas.itemconfigure("field", image=self.images["covered"])
+
+        self.labels["mines"].config(text="Mines: {}".format(self.game.num_mines))
+        self.labels["alive"].config(text="Alive")
+        self.labels["opened"].config(text="Opened: 0")
+        self.strategy_grid.nametowidget("csp_button").config(state=tk.NORMAL)
+        self.strategy_grid.nametowidget("sat_button").config(state=tk.NORMAL)
+        self.set_controls(tk.DISABLED)
@@ -0,0 +1,96 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# phases of a strategy step, in the order they run
+PHASES = ("constraints", "propagate", "deduce", "solve", "certify", "guess", "reveal")
+
+
+class Timer:
+    """
+    Context manager that adds time spent inside it to one phase of the recorder.
+    Timers are created once per phase and reused.
+    """
+
+    def __init__(self, recorder, phase):
+        self.recorder = recorder
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add_time(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+class Recorder:
+    """
+    In-memory record of where a strategy spends its time.
+
+    For every phase the total time and the number of times it ran are kept (time of "solve"
+    is spent inside the backend solver and time of "certify" in checks of its results, both
+    are also part of "deduce"). Counters sum values such as guesses or opened fields over
+    the game. Every finished step is kept in `steps` (unless keep_steps is False), passed to
+    the callback and logged at the given level, so with the default DEBUG level steps are
+    only formatted when debug logging is on.
+    """
+
+    def __init__(self, callback=None, level=logging.DEBUG, keep_steps=True):
+        self.callback = callback
+        self.level = level
+        self.keep_steps = keep_steps
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.counters = {}
+        self.steps = []
+        self._timers = {}
+
+    def phase(self, name):
+        """
+        Return context manager timing the phase with the given name.
+        """
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = Timer(self, name)
+        return timer
+
+    def add_time(self, phase, elapsed):
+        self.times[phase] = self.times.get(phase, 0.0) + elapsed
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def end_step(self, report):
+        """
+        Record report (dict) of a finished step.
+        """
+        self.count("steps")
+        if self.keep_steps:
+            self.steps.append(report)
+        if self.callback is not None:
+            self.callback(report)
+        if logger.isEnabledFor(self.level):
+            logger.log(self.level, "Step %d: %s", self.counters["steps"], report)
+
+    def summary(self):
+        """
+        Return dict with phase times and calls and the counters.
+        """
+        return {"times": dict(self.times), "calls": dict(self.calls), "counters": dict(self.counters)}
+
+    def to_dict(self):
+        result = self.summary()
+        result["steps"] = list(self.steps)
+        return result
+
+    def dump(self, file, **kwargs):
+        """
+        Write summary and steps as JSON to an open file, keyword arguments go to json.dump.
+        """
+        json.dump(self.to_dict(), file, **kwargs)
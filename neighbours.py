@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import numpy as np
+
+# row and column offsets of the 8 adjacent fields
+NEIGHBOUR_ROWS = np.array([-1, -1, -1, 0, 0, 1, 1, 1])
+NEIGHBOUR_COLUMNS = np.array([-1, 0, 1, -1, 1, -1, 0, 1])
+NEIGHBOUR_OFFSETS = tuple(zip(NEIGHBOUR_ROWS.tolist(), NEIGHBOUR_COLUMNS.tolist()))
+
+
+class NeighbourTable:
+    """
+    Ids of adjacent fields for every field of a rows x columns board.
+
+    Ids are the same as Field.id (row * columns + column + 1), id 0 is unused and has no
+    neighbours. Adjacent ids are computed from the position of the field, so the table takes
+    no memory per field, only tuples of the cache_size fields asked for last are kept.
+    """
+
+    def __init__(self, rows, columns, cache_size=4096):
+        self.rows = rows
+        self.columns = columns
+        self.cache_size = cache_size
+
+        # tuples of recently used fields, least recently used first; strategies ask for
+        # the same frontier fields again and again, so most accesses do not allocate
+        self._tuples = OrderedDict()
+
+    def __len__(self):
+        return self.rows * self.columns + 1
+
+    def __getitem__(self, id):
+        """
+        Return tuple of ids adjacent to field with the given id.
+        """
+        adjacent = self._tuples.get(id)
+        if adjacent is not None:
+            self._tuples.move_to_end(id)
+            return adjacent
+        if not id:
+            return ()
+
+        row, column = divmod(id - 1, self.columns)
+        adjacent = self._tuples[id] = tuple(
+            (row + i) * self.columns + column + j + 1 for (i, j) in NEIGHBOUR_OFFSETS
+            if 0 <= row + i < self.rows and 0 <= column + j < self.columns)
+        if len(self._tuples) > self.cache_size:
+            self._tuples.popitem(last=False)
+        return adjacent
+
+    def adjacent(self, ids):
+        """
+        Return numpy array with ids adjacent to any of the fields in numpy array ids,
+        ids adjacent to more fields are repeated.
+        """
+        columns = self.columns
+        # shift every id by the flat offsets of its neighbours, then drop the ones that fall
+        # outside the board or wrap around to the next row
+        adjacent = ids[:, None] + (NEIGHBOUR_ROWS * columns + NEIGHBOUR_COLUMNS)
+        adjacent_columns = ((ids - 1) % columns)[:, None] + NEIGHBOUR_COLUMNS
+        inside = (adjacent >= 1) & (adjacent <= self.rows * columns) & \
+                 (adjacent_columns >= 0) & (adjacent_columns < columns)
+        return adjacent[inside]
@@ -0,0 +1,200 @@
+import logging
+from collections import namedtuple
+from math import comb
+
+logger = logging.getLogger(__name__)
+
+# solutions of a component grouped by number of mines: dict mines -> number of solutions,
+# and dict mines -> list with number of solutions in which each component field is a mine
+# (in the order of component cells). exact is False if enumeration was over the budget.
+Enumeration = namedtuple("Enumeration", ["cells", "solutions", "field_counts", "exact"])
+
+
+class EnumerationLimit(Exception):
+    pass
+
+
+def enumerate_component(component, limit):
+    """
+    Count all assignments of mines to component fields that satisfy its constraints,
+    grouped by number of mines. Backtracking stops with EnumerationLimit after limit steps.
+    """
+    cells = component.cells
+    index = {cell: i for (i, cell) in enumerate(cells)}
+    constraints = list(component.constraints)
+    # mines still to be placed and fields still unassigned for every constraint
+    need = [constraint.mines for constraint in constraints]
+    free = [len(constraint.cells) for constraint in constraints]
+    cell_constraints = [[] for _ in cells]
+    for (c, constraint) in enumerate(constraints):
+        for cell in constraint.cells:
+            cell_constraints[index[cell]].append(c)
+
+    solutions = {}
+    field_counts = {}
+    assignment = [0] * len(cells)
+    steps = 0
+
+    def place(i, mines):
+        nonlocal steps
+        steps += 1
+        if steps > limit:
+            raise EnumerationLimit()
+
+        if i == len(cells):
+            solutions[mines] = solutions.get(mines, 0) + 1
+            counts = field_counts.setdefault(mines, [0] * len(cells))
+            for (j, value) in enumerate(assignment):
+                counts[j] += value
+            return
+
+        for value in (0, 1):
+            if all(0 <= need[c] - value <= free[c] - 1 for c in cell_constraints[i]):
+                for c in cell_constraints[i]:
+                    need[c] -= value
+                    free[c] -= 1
+                assignment[i] = value
+                place(i + 1, mines + value)
+                for c in cell_constraints[i]:
+                    need[c] += value
+                    free[c] += 1
+        assignment[i] = 0
+
+    place(0, 0)
+    return Enumeration(cells, solutions, field_counts, True)
+
+
+def approximate_component(component):
+    """
+    Estimate for components too large to enumerate: every field gets the highest ratio
+    of mines to fields among its constraints, as if it was the only solution.
+    """
+    ratio = {}
+    for constraint in component.constraints:
+        for cell in constraint.cells:
+            ratio[cell] = max(ratio.get(cell, 0.0), constraint.mines / len(constraint.cells))
+    mines = round(sum(ratio.values()))
+    return Enumeration(component.cells, {mines: 1}, {mines: [ratio[cell] for cell in component.cells]}, False)
+
+
+def convolve(a, b):
+    """
+    Combine two distributions dict mines -> weight into distribution of their sum
+    """
+    result = {}
+    for (i, x) in a.items():
+        for (j, y) in b.items():
+            result[i + j] = result.get(i + j, 0) + x * y
+    return result
+
+
+class ProbabilityEngine:
+    """
+    Exact probability that a covered field is a mine, given the constraints and the number
+    of mines left.
+
+    Solutions of every component are enumerated separately and weighted by the number of
+    ways to place the remaining mines on the interior (covered fields not next to any opened
+    field). Enumerations are cached by the component constraints, so components that did not
+    change since the last call are not counted again.
+    """
+
+    # components with more fields are only approximated (see approximate_component)
+    max_fields = 400
+
+    def __init__(self, limit=200000):
+        """
+        Limit is the maximum number of backtracking steps for one component.
+        """
+        self.limit = limit
+        self.cache = {}
+
+    def enumerate(self, component):
+        enumeration = self.cache.get(component.constraints)
+        if enumeration is None:
+            try:
+                if len(component.cells) > self.max_fields:
+                    raise EnumerationLimit()
+                enumeration = enumerate_component(component, self.limit)
+            except EnumerationLimit:
+                enumeration = approximate_component(component)
+        return enumeration
+
+    def probabilities(self, components, interior, mines_left, density=None):
+        """
+        Return dict field id -> mine probability for all component fields, and probability
+        for any interior field (None if there are no interior fields).
+
+        If density is given, every field is a mine with that probability independently of
+        the others instead of the total number of mines being fixed (see independent).
+        """
+        enumerations = [self.enumerate(component) for component in components]
+        # keep only enumerations of the current components in the cache
+        self.cache = {component.constraints: enumeration
+                      for (component, enumeration) in zip(components, enumerations)}
+        if density is not None:
+            return self.independent(enumerations, density), density if interior else None
+
+        # distribution of mines on all components except the i-th one
+        prefix = [{0: 1}]
+        for enumeration in enumerations:
+            prefix.append(convolve(prefix[-1], enumeration.solutions))
+        suffix = [{0: 1}]
+        for enumeration in reversed(enumerations):
+            suffix.append(convolve(suffix[-1], enumeration.solutions))
+        suffix.reverse()
+
+        def interior_ways(mines):
+            if mines < 0 or mines > interior:
+                return 0
+            return comb(interior, mines)
+
+        total = sum(weight * interior_ways(mines_left - mines) for (mines, weight) in prefix[-1].items())
+        if total == 0:
+            # constraints disagree with the number of mines, should not happen in a valid game
+            # unless some component was only approximated
+            if all(enumeration.exact for enumeration in enumerations):
+                logger.warning("Constraints have no solution with %d mines left", mines_left)
+            total = 1
+
+        probabilities = {}
+        for (i, enumeration) in enumerate(enumerations):
+            others = convolve(prefix[i], suffix[i + 1])
+            counts = [0] * len(enumeration.cells)
+            for (mines, field_counts) in enumeration.field_counts.items():
+                # number of ways to complete the board for solutions with this many mines
+                ways = sum(weight * interior_ways(mines_left - mines - other) for (other, weight) in others.items())
+                for (j, count) in enumerate(field_counts):
+                    counts[j] += count * ways
+            for (cell, count) in zip(enumeration.cells, counts):
+                probabilities[cell] = count / total
+
+        interior_probability = None
+        if interior:
+            expected = sum(weight * interior_ways(mines_left - mines) * (mines_left - mines)
+                           for (mines, weight) in prefix[-1].items())
+            interior_probability = expected / total / interior
+
+        return probabilities, interior_probability
+
+    @staticmethod
+    def independent(enumerations, density):
+        """
+        Probabilities when every field is a mine with probability density, used on boards
+        too big for the total number of mines to matter. A solution with m mines has weight
+        (density / (1 - density)) ** m, and components do not depend on each other.
+        """
+        ratio = density / (1 - density)
+        probabilities = {}
+        for enumeration in enumerations:
+            # weights relative to the solutions with the fewest mines, so they do not underflow
+            fewest = min(enumeration.solutions)
+            total = sum(count * ratio ** (mines - fewest) for (mines, count) in enumeration.solutions.items())
+            counts = [0.0] * len(enumeration.cells)
+            for (mines, field_counts) in enumeration.field_counts.items():
+                weight = ratio ** (mines - fewest)
+                for (j, count) in enumerate(field_counts):
+                    counts[j] += count * weight
+            for (cell, count) in zip(enumeration.cells, counts):
+                probabilities[cell] = count / total
+        return probabilities
@@ -0,0 +1,552 @@
+"""
+Local solver service: analyze partial boards sent by other tools over a socket.
+
+Clients connect to a Unix socket or a localhost TCP port and send one JSON request per
+line, responses are sent one per line as soon as they are ready, so they can come out of
+order and carry the id of their request. Request:
+
+    {"id": 1, "board": ["01?", "12?", "F??"], "mines": 2, "strategy": "SAT"}
+
+Board is a list of rows, every field is a digit (opened field with that many adjacent
+mines), "?" (covered) or "F" (covered field known to be a mine). Mines (total number of
+mines on the board) and density (probability that a field is a mine) are optional, without
+both of them mine probabilities are not computed and the total number of mines is not used
+in deductions. Strategy is "SAT" (default) or "CSP", certify is optional, "lp" or "sat"
+(see Strategy.certify_result). Response:
+
+    {"id": 1, "safe": [[2, 1], [2, 2]], "mines": [], "probabilities": [[0, 2, 0.5], [1, 2, 0.5]],
+     "interior": null, "sound": true, "solver_calls": 4, "pooled_solvers": 3, "new_solvers": 0,
+     "time": 0.0008}
+
+Safe and mines are [row, column] of fields that follow from the board (flags are not
+repeated), probabilities are [row, column, probability] for the other covered fields next
+to opened ones and interior is the probability for any covered field not next to an opened
+one. Results of CSP are not proven (sound is false), its probabilities are still exact.
+Pooled_solvers and new_solvers count the pysat solvers the request took from the pool of
+its worker and the ones that had to be created.
+Errors, also for boards that no placement of mines agrees with, are answered with
+{"id": ..., "error": "message"}. Request {"op": "stats"} returns the request counts,
+queue depth, batch sizes, latency percentiles and solver pool hits of the service.
+
+Requests are analyzed on a pool of worker processes, each with warm strategies whose
+caches of solved components are kept between requests, and with one long-lived pysat solver
+per solver setup that all SAT problems of the worker are solved on, each behind its own
+selector literal (see solverpool.py). Requests waiting in the queue are sent to a worker
+together, up to max_batch requests or batch_fields fields, so small requests share one
+round trip to the pool. Example:
+
+    python3 service.py --unix /tmp/minesweeper.sock
+    echo '{"id": 1, "board": ["1?", "11"], "mines": 1}' | nc -U /tmp/minesweeper.sock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from constraints import ConstraintSet
+from metrics import Recorder
+from neighbours import NeighbourTable
+from solverpool import SolverPool
+from strategy import STRATEGIES
+
+logger = logging.getLogger(__name__)
+
+# field of a Position, has the attributes of board.Field that strategies use
+Cell = namedtuple("Cell", ["id", "row", "column"])
+
+# strategies of this worker process by name, reused for all requests
+_strategies = {}
+# pysat solvers of this worker process, shared by all its strategies
+_pool = SolverPool()
+
+
+class Position:
+    """
+    Partial board sent by a client. Stands in for the game of a strategy, which only needs
+    the number of mines, the number of covered fields and positions of fields.
+    """
+
+    def __init__(self, covered, flags, counts, num_mines=None, density=None):
+        """
+        Covered, flags and counts are arrays (rows, columns) like on Minesweeper.
+        """
+        self.rows, self.columns = covered.shape
+        self.covered = covered
+        self.flags = flags
+        self.counts = counts
+        self.num_mines = num_mines
+        self.density = density
+        self.neighbours = NeighbourTable(self.rows, self.columns)
+
+    @classmethod
+    def parse(cls, board, num_mines=None, density=None):
+        """
+        Create position from a list of rows, see the module docstring for the format.
+        """
+        if not isinstance(board, list) or not board or not all(isinstance(row, str) for row in board):
+            raise ValueError("Board must be a non-empty list of strings")
+        columns = len(board[0])
+        if not columns or any(len(row) != columns for row in board):
+            raise ValueError("Board rows must be non-empty and of the same length")
+        if num_mines is not None and (not isinstance(num_mines, int) or num_mines < 0):
+            raise ValueError("Number of mines must be a non-negative integer")
+        if density is not None and (not isinstance(density, (int, float)) or not 0 < density < 1):
+            raise ValueError("Density must be between 0 and 1")
+
+        try:
+            fields = np.frombuffer("".join(board).encode("ascii"), dtype=np.uint8)
+        except UnicodeEncodeError:
+            raise ValueError("Fields must be digits, '?' or 'F'") from None
+        fields = fields.reshape(len(board), columns)
+        flags = fields == ord("F")
+        covered = flags | (fields == ord("?"))
+        digits = (fields >= ord("0")) & (fields <= ord("8"))
+        if not (covered | digits).all():
+            raise ValueError("Fields must be digits, '?' or 'F'")
+        counts = np.where(digits, fields - ord("0"), 0).astype(np.int8)
+        return cls(covered, flags, counts, num_mines, density)
+
+    def num_closed(self):
+        return int(np.count_nonzero(self.covered))
+
+    def get_field_by_id(self, id):
+        row, column = divmod(id - 1, self.columns)
+        return Cell(id, row, column)
+
+    def constraint_set(self):
+        """
+        Return ConstraintSet with flags as known mines and constraints of all opened fields
+        next to covered ones. Raises ValueError if an opened field has more adjacent mines
+        than covered neighbours or fewer than flagged ones.
+        """
+        constraints = ConstraintSet()
+        for id in (np.flatnonzero(self.flags) + 1).tolist():
+            constraints.resolve(id, True)
+
+        covered = self.covered.reshape(-1)
+        flags = self.flags.reshape(-1)
+        counts = self.counts.reshape(-1)
+        opened = np.flatnonzero(~covered) + 1
+        for id in opened.tolist():
+            cells = [cell for cell in self.neighbours[id] if covered[cell - 1]]
+            mines = int(counts[id - 1])
+            flagged = sum(bool(flags[cell - 1]) for cell in cells)
+            if not flagged <= mines <= len(cells):
+                raise ValueError("Board has no solution: field {} has {} adjacent mines, {} covered and {} "
+                                 "flagged neighbours".format(list(divmod(id - 1, self.columns)), mines,
+                                                             len(cells), flagged))
+            if cells:
+                constraints.add(id, cells, mines)
+        return constraints
+
+    def check_solvable(self, constraints, checker):
+        """
+        Raise ValueError if no placement of mines agrees with the constraints (ConstraintSet
+        from constraint_set) and with the number of mines, if it is given. Checked with the
+        solver of checker (SAT strategy).
+        """
+        low, high = None, None
+        if self.num_mines is not None:
+            left = self.num_mines - len(constraints.mines)
+            interior = self.num_closed() - len(constraints.frontier) - len(constraints.mines)
+            low, high = max(0, left - interior), left
+            if left < 0 or low > len(constraints.frontier):
+                raise ValueError("Board has no solution with {} mines".format(self.num_mines))
+        if not constraints.constraints:
+            return
+
+        solver, _ = checker.make_coupled_solver(list(constraints.constraints.values()), low, high)
+        try:
+            solvable = solver.solve()
+        finally:
+            solver.delete()
+        if not solvable:
+            raise ValueError("Board has no solution" if low is None else
+                             "Board has no solution with {} mines".format(self.num_mines))
+
+
+def board_rows(game):
+    """
+    Return board of a Minesweeper game in the request format, marked fields are flags.
+    """
+    fields = np.where(game.covered, np.where(game.flags, ord("F"), ord("?")), game.counts + ord("0"))
+    return [bytes(row.astype(np.uint8)).decode("ascii") for row in fields]
+
+
+def check_request(request):
+    """
+    Check types of the strategy, certification and board of the request (dict), so a bad
+    request is rejected before it is queued. Returns (strategy name, certify), raises
+    ValueError.
+    """
+    name = request.get("strategy", "SAT")
+    if not isinstance(name, str) or name not in STRATEGIES:
+        raise ValueError("Unknown strategy {}, use one of {}".format(name, sorted(STRATEGIES)))
+    certify = request.get("certify")
+    if certify is not None and (not isinstance(certify, str) or certify not in STRATEGIES[name].certify_methods):
+        raise ValueError("Unknown certification {} for {}, use one of {}".format(
+            certify, name, STRATEGIES[name].certify_methods))
+    board = request.get("board")
+    if not isinstance(board, list) or not board or not all(isinstance(row, str) for row in board):
+        raise ValueError("Board must be a non-empty list of strings")
+    return name, certify
+
+
+def _strategy(name, position, certify=None):
+    strategy = _strategies.get((name, certify))
+    if strategy is None:
+        strategy = STRATEGIES[name](position, metrics=Recorder(keep_steps=False), certify=certify, pool=_pool)
+        _strategies[(name, certify)] = strategy
+    return strategy
+
+
+def analyze(request):
+    """
+    Analyze one request (dict, see the module docstring) in this process and return the
+    response without id. Raises ValueError for an invalid request.
+    """
+    start = time.perf_counter()
+    name, certify = check_request(request)
+    num_mines, density = request.get("mines"), request.get("density")
+    position = Position.parse(request.get("board"), num_mines, density)
+
+    hits, misses = _pool.hits, _pool.misses
+    strategy = _strategy(name, position, certify)
+    strategy.game = position
+    strategy.constraints = constraints = position.constraint_set()
+    position.check_solvable(constraints, _strategy("SAT", position))
+    solver_calls = strategy.solver_calls
+
+    mines, safe = constraints.propagate() if strategy.propagate else ([], [])
+    deduced_mines, deduced_safe = strategy.deduce()
+    if strategy.sound:
+        for id in deduced_mines:
+            constraints.resolve(id, True)
+        for id in deduced_safe:
+            constraints.resolve(id, False)
+    mines += deduced_mines
+    safe += deduced_safe
+
+    def positions(ids):
+        return [list(divmod(id - 1, position.columns)) for id in sorted(ids)]
+
+    response = {"safe": positions(safe), "mines": positions(mines), "probabilities": None, "interior": None,
+                "sound": strategy.sound}
+    if num_mines is not None or density is not None:
+        mines_left = num_mines - len(constraints.mines) if num_mines is not None else 0
+        probabilities, interior = strategy.probability.probabilities(
+            constraints.components(), strategy.interior(), mines_left, density)
+        response["probabilities"] = [divmod(id - 1, position.columns) + (probability,)
+                                     for (id, probability) in sorted(probabilities.items())]
+        response["interior"] = interior
+    response["solver_calls"] = strategy.solver_calls - solver_calls
+    response["pooled_solvers"] = _pool.hits - hits
+    response["new_solvers"] = _pool.misses - misses
+    response["time"] = time.perf_counter() - start
+    return response
+
+
+def analyze_batch(requests):
+    """
+    Analyze list of requests, returns list of responses. Errors are returned as responses,
+    so one bad request does not fail the others in its batch.
+    """
+    responses = []
+    for request in requests:
+        try:
+            responses.append(analyze(request))
+        except ValueError as error:
+            responses.append({"error": str(error)})
+        except Exception as error:
+            logger.exception("Request failed")
+            # state of a solver may be broken, the next requests get new strategies and solvers
+            _strategies.clear()
+            _pool.clear()
+            responses.append({"error": "internal error: {}".format(error)})
+    return responses
+
+
+def warm_up():
+    """
+    Create the strategies of this worker and solve a small board with each, so the first
+    requests do not pay for imports, solver setup and first calls.
+    """
+    for name in STRATEGIES:
+        analyze({"board": ["1?", "11"], "mines": 1, "strategy": name})
+
+
+class ServiceStats:
+    """
+    Counters and recent latencies of the service, latency is measured from receiving the
+    request to writing its response.
+    """
+
+    def __init__(self, window=10000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window)
+        self.worker_times = deque(maxlen=window)
+        # pysat solvers taken from the pools of the workers, and created for requests
+        self.pooled_solvers = 0
+        self.new_solvers = 0
+
+    def to_dict(self, queue_depth):
+        uptime = time.perf_counter() - self.started
+        result = {
+            "uptime": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "requests_per_second": self.requests / uptime if uptime else 0.0,
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight_batches": self.in_flight,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "solver_pool": {"hits": self.pooled_solvers, "new_solvers": self.new_solvers},
+        }
+        if self.latencies:
+            p50, p90, p99 = np.percentile(self.latencies, [50, 90, 99]).tolist()
+            result["latency_ms"] = {"p50": 1000 * p50, "p90": 1000 * p90, "p99": 1000 * p99,
+                                    "max": 1000 * max(self.latencies)}
+        if self.worker_times:
+            result["mean_worker_time_ms"] = 1000 * float(np.mean(self.worker_times))
+        return result
+
+
+class SolverService:
+    """
+    Asyncio server that queues requests from all connections and analyzes them in batches
+    on a pool of processes.
+    """
+
+    def __init__(self, workers=None, max_batch=64, batch_fields=16384, batch_delay=0.001):
+        """
+        Workers is the number of processes (default: CPU count), 0 analyzes requests in one
+        thread of this process. A batch is sent when it has max_batch requests or
+        batch_fields fields, or batch_delay seconds after its first request if fewer are
+        waiting. At most two batches per worker are in flight, the rest waits in the queue.
+        """
+        self.workers = os.cpu_count() if workers is None else workers
+        self.max_batch = max_batch
+        self.batch_fields = batch_fields
+        self.batch_delay = batch_delay
+        self.stats = ServiceStats()
+        self.queue = None
+        self.executor = None
+        self.server = None
+        self._tasks = set()
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """
+        Start the worker pool and listen on the Unix socket path, or on host and port.
+        """
+        if self.workers:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=warm_up)
+        else:
+            self.executor = ThreadPoolExecutor(1, initializer=warm_up)
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(loop.run_in_executor(self.executor, os.getpid)
+                                      for _ in range(max(self.workers, 1))))
+        logger.info("Started %d workers: %s", len(set(pids)), sorted(set(pids)))
+
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(2 * max(self.workers, 1))
+        self._spawn(self._dispatch())
+        # boards of big requests do not fit the default line limit of 64 KiB
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=path, limit=2 ** 24)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=2 ** 24)
+        for socket in self.server.sockets:
+            logger.info("Listening on %s", socket.getsockname())
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in list(self._tasks):
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def _spawn(self, coroutine):
+        # tasks are referenced until they finish, asyncio keeps only weak references
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def submit(self, request):
+        """
+        Queue request (dict) that passed check_request for analysis and return its response.
+        """
+        size = sum(len(row) for row in request["board"])
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((request, size, future))
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _collect(self):
+        """
+        Wait for the first waiting request and return it with the ones queued behind it,
+        within the limits of one batch.
+        """
+        batch = [await self.queue.get()]
+        fields = batch[0][1]
+        waited = False
+        while len(batch) < self.max_batch and fields < self.batch_fields:
+            if self.queue.empty():
+                if waited or not self.batch_delay:
+                    break
+                # under light load wait a little for more requests to share the batch
+                await asyncio.sleep(self.batch_delay)
+                waited = True
+                continue
+            item = self.queue.get_nowait()
+            batch.append(item)
+            fields += item[1]
+        return batch
+
+    async def _dispatch(self):
+        while True:
+            # collect only when a worker is free, so batches grow while workers are busy
+            await self._slots.acquire()
+            batch = await self._collect()
+            self._spawn(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        stats = self.stats
+        stats.batches += 1
+        stats.batched_requests += len(batch)
+        stats.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            responses = await loop.run_in_executor(self.executor, analyze_batch, [item[0] for item in batch])
+        except Exception as error:
+            logger.exception("Batch of %d requests failed", len(batch))
+            responses = [{"error": "internal error: {}".format(error)}] * len(batch)
+        finally:
+            stats.in_flight -= 1
+            self._slots.release()
+        for ((_, _, future), response) in zip(batch, responses):
+            if "time" in response:
+                stats.worker_times.append(response["time"])
+                stats.pooled_solvers += response["pooled_solvers"]
+                stats.new_solvers += response["new_solvers"]
+            if not future.done():
+                future.set_result(response)
+
+    async def respond(self, line):
+        """
+        Return response (dict) to one request line.
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError as error:
+            return {"id": None, "error": str(error)}
+
+        op = request.get("op", "analyze")
+        try:
+            if op == "stats":
+                response = self.stats.to_dict(self.queue.qsize())
+            elif op == "analyze":
+                check_request(request)
+                response = dict(await self.submit(request))
+            else:
+                response = {"error": "Unknown op {}".format(op)}
+        except ValueError as error:
+            response = {"error": str(error)}
+        except Exception as error:
+            # every request gets an answer, also when the service itself fails
+            logger.exception("Request failed")
+            response = {"error": "internal error: {}".format(error)}
+        response["id"] = request.get("id")
+        return response
+
+    async def handle(self, reader, writer):
+        """
+        Serve one connection, every request line is answered by its own task.
+        """
+        lock = asyncio.Lock()
+        pending = set()
+
+        async def answer(line, received):
+            response = await self.respond(line)
+            self.stats.requests += 1
+            if "error" in response:
+                self.stats.errors += 1
+            data = json.dumps(response, separators=(",", ":")).encode() + b"\n"
+            async with lock:
+                writer.write(data)
+                await writer.drain()
+            self.stats.latencies.append(time.perf_counter() - received)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(answer(line, time.perf_counter()))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as error:
+            logger.info("Connection closed: %s", error)
+            for task in pending:
+                task.cancel()
+        finally:
+            writer.close()
+
+    async def log_stats(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info("Stats: %s", self.stats.to_dict(self.queue.qsize()))
+
+
+async def serve(args):
+    service = SolverService(args.workers, args.max_batch, args.batch_fields, args.batch_delay / 1000)
+    server = await service.start(args.host, args.port, args.unix)
+    if args.stats_interval:
+        service._spawn(service.log_stats(args.stats_interval))
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Minesweeper board analysis over a local socket.")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: CPU count, 0: none)")
+    parser.add_argument("--max-batch", type=int, default=64, help="most requests sent to a worker at once")
+    parser.add_argument("--batch-fields", type=int, default=16384, help="most board fields sent to a worker at once")
+    parser.add_argument("--batch-delay", type=float, default=1.0,
+                        help="milliseconds to wait for more requests to fill a batch")
+    parser.add_argument("--stats-interval", type=float, default=0, help="log stats every this many seconds")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Long-lived pysat solvers that many small problems are solved on in turn.
+
+Every problem taken from the pool gets a new selector variable, all its clauses and
+cardinality constraints are guarded by the selector and every call assumes it, so the
+problem is switched off for good with the unit clause [-selector] when it is released.
+Clauses learned from a problem contain its selector too, so they are switched off with it.
+
+Only selectors of released problems are fixed, other variables are free again and the
+next problem numbers its variables right above its selector. Solving takes time for every
+variable of the solver, so solvers are replaced once they have max_vars variables.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSolver:
+    """
+    One problem on a solver of the pool, has the methods of a pysat solver that strategies
+    use. Delete releases the problem and gives the solver back to the pool.
+    """
+
+    def __init__(self, pool, key, solver, selectors, top):
+        """
+        Selectors is the number of variables fixed by released problems (1..selectors),
+        top the highest variable the solver has.
+        """
+        self.pool = pool
+        self.key = key
+        self.solver = solver
+        self.selector = selectors + 1
+        # highest variable of this problem, and of the solver
+        self.top = self.selector
+        self.solver_top = max(top, self.selector)
+
+    def _use(self, literals):
+        self.top = max(self.top, max((abs(literal) for literal in literals), default=0))
+
+    def nof_vars(self):
+        return self.top
+
+    def supports_atmost(self):
+        return self.solver.supports_atmost()
+
+    def add_clause(self, clause):
+        self._use(clause)
+        self.solver.add_clause(list(clause) + [-self.selector])
+
+    def add_atmost(self, literals, bound):
+        """
+        Add constraint that at most bound of literals are true while the selector is
+        assumed. The selector is added len(literals) - bound times, so without it the
+        constraint is at most len(literals) of them, which always holds. Native cardinality
+        constraints of minicard and gluecard count repeated literals.
+        """
+        self._use(literals)
+        if bound < len(literals):
+            self.solver.add_atmost(list(literals) + [self.selector] * (len(literals) - bound), len(literals))
+
+    def append_formula(self, formula):
+        """
+        Add CNF or CNFPlus formula, e.g. from pysat.card.CardEnc.
+        """
+        self.top = max(self.top, formula.nv)
+        for clause in formula.clauses:
+            self.add_clause(clause)
+        for (literals, bound) in getattr(formula, "atmosts", ()):
+            self.add_atmost(literals, bound)
+
+    def solve(self, assumptions=()):
+        return self.solver.solve(assumptions=list(assumptions) + [self.selector])
+
+    def get_model(self):
+        return self.solver.get_model()
+
+    def set_phases(self, literals):
+        self.solver.set_phases(literals)
+
+    def delete(self):
+        if self.solver is not None:
+            self.solver.add_clause([-self.selector])
+            self.pool.release(self.key, self.solver, self.selector, max(self.solver_top, self.top))
+            self.solver = None
+
+
+class SolverPool:
+    """
+    Idle pysat solvers by (solver name, encoding), one per key. A problem taken while the
+    solver of its key is in use gets a new solver, which is kept only if the key has no
+    idle solver when it is released.
+    """
+
+    def __init__(self, max_vars=1000):
+        """
+        Solvers with more than max_vars variables are deleted when released.
+        """
+        self.max_vars = max_vars
+        self.idle = {}
+        # problems that got an idle solver, and problems that needed a new one
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, solver_name, encoding):
+        """
+        Return PooledSolver for a new problem, see the module docstring.
+        """
+        from pysat.solvers import Solver as SATSolver
+
+        key = (solver_name, encoding)
+        entry = self.idle.pop(key, None)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = SATSolver(name=solver_name), 0, 0
+        return PooledSolver(self, key, *entry)
+
+    def release(self, key, solver, selectors, top):
+        if key in self.idle or top > self.max_vars:
+            solver.delete()
+        else:
+            self.idle[key] = (solver, selectors, top)
+
+    def clear(self):
+        """
+        Delete all idle solvers.
+        """
+        for (solver, _, _) in self.idle.values():
+            solver.delete()
+        self.idle.clear()
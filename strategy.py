@@ -1,222 +1,686 @@
-from abc import ABC
-from cassowary import SimplexSolver, Variable
+import itertools
+import logging
+import time
+from abc import ABC, abstractmethod
 from random import choice, randint
-from pysat.solvers import Solver as SATSolver
-from pysat.card import CardEnc, EncType
+from constraints import ConstraintSet
+from metrics import Recorder
+from probability import ProbabilityEngine
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 class Strategy(ABC):
+    """
+    Common part of the solving strategies.
+
+    Constraints of the opened fields are kept in a ConstraintSet and split into independent
+    components. Each component is solved separately by the backend (solve_component) and is
+    solved again only when its constraints change. Total number of mines is used only
+    when components alone give no move (solve_coupled).
+    """
+    name = None
+    # True if every mine and safe field returned by the backend is certain
+    sound = True
+    # ways to prove results of the backend, see certify_result
+    certify_methods = ("sat",)
+    # True if the same seed gives the same moves in every process
+    reproducible = True
+
+    def __init__(self, game, propagate=True, metrics=None, certify=None, pool=None):
+        """
+        With propagate set, simple deductions (see ConstraintSet.propagate) are made before
+        the backend is used, and the backend is called only when they give no safe field.
 
-    def get_random_field(self):
-        pass
+        Metrics is the Recorder that gets phase timings and the report of every step,
+        a new one is created if not given.
 
-    def open(self, field):
-        pass
+        With certify set to one of certify_methods, every mine and safe field found by the
+        backend is proven before it is used and the ones that are not proven are dropped,
+        so a step without a proven safe field guesses by probability. Results are then
+        sound even for a backend that is not.
 
-    def make_constraint(self, row_index, col_index):
-        pass
-
-    def first_step(self, first_field=None):
-        pass
+        With pool (see solverpool.SolverPool) set, pysat solvers of the strategy and of its
+        exact_check are taken from the pool instead of being created for every problem.
+        """
+        if certify is not None and certify not in self.certify_methods:
+            raise ValueError("Unknown certification {}, use one of {}".format(certify, self.certify_methods))
+        self.game = game
+        self.propagate = propagate
+        self.certify = certify
+        self.pool = pool
+        if certify is not None:
+            self.sound = True
+        # SAT strategy used by exact_check, created on first use
+        self.checker = None
+        self.metrics = metrics if metrics is not None else Recorder()
+        self.constraints = ConstraintSet()
+        self.newly_opened = []
+        # results of solve_component for components of the last step
+        self.solved = {}
+        self.probability = ProbabilityEngine()
 
-    def step(self):
-        pass
+    # counters of the backend solver usage, read by the benchmark
+    @property
+    def solver_calls(self):
+        return self.metrics.calls["solve"]
 
+    @property
+    def solver_time(self):
+        return self.metrics.times["solve"]
 
-class CSP(Strategy):
+    def _solver_call(self, method, *args, **kwargs):
+        """
+        Call the backend solver method and count time spent in it
+        """
+        start = time.perf_counter()
+        result = method(*args, **kwargs)
+        self.metrics.add_time("solve", time.perf_counter() - start)
+        return result
 
-    def __init__(self, game):
-        self.game = game
-        self.solver = SimplexSolver()
-        self.current_adjacent_fields = []
-        self.newly_opened = []
-        self.vars = [[Variable("a[{}][{}]".format(j, i)) for i in range(self.game.board_dim)]
-                     for j in range(self.game.board_dim)]
+    def interior(self):
+        """
+        Return number of covered fields that are not on the frontier and whose value is not known
+        """
+        return self.game.num_closed() - len(self.constraints.frontier) - \
+            len(self.constraints.mines) - len(self.constraints.safe)
 
     def get_random_field(self):
-        while True:
-            i = randint(0, self.game.board_dim - 1)
-            j = randint(0, self.game.board_dim - 1)
-            if self.vars[i][j].value == 0 and self.game.board[i][j].covered:
-                break
+        """
+        Return random covered field that is not known to be a mine
+        """
+        return self.game.random_covered(self.constraints.mines, randint)
 
-        return self.game.board[i][j]
+    def guess(self):
+        """
+        Return covered field with the lowest probability of being a mine (see ProbabilityEngine)
+        """
+        interior = self.interior()
+        probabilities, interior_probability = self.probability.probabilities(
+            self.constraints.components(), interior, self.game.num_mines - len(self.constraints.mines),
+            self.game.density)
 
-    def open(self, field):
-        boundary_list = []
-        for field in self.game.open_field(field):
+        best = min(probabilities.values(), default=1.0)
+        if interior_probability is not None and interior_probability < best:
+            logger.debug("[%s] Guessing interior field, probability %.3f", self.name, interior_probability)
+            known = itertools.chain(self.constraints.frontier, self.constraints.mines, self.constraints.safe)
+            return self.game.random_covered(known, randint)
 
-            # this case is really interesting, we are opening a field that is safe but solver
-            # thinks that it is mined. We need to edit and enforce as stay constraint
-            if self.vars[field.row][field.column] != 0:
-                self.vars[field.row][field.column].value = 0
-            self.solver.add_stay(self.vars[field.row][field.column])
+        candidates = [id for (id, probability) in probabilities.items() if probability <= best + 1e-9]
+        logger.debug("[%s] Guessing one of %s, probability %.3f", self.name, candidates, best)
+        return self.game.get_field_by_id(choice(candidates))
 
-            # if adjacent_mines is set we are looking at boundary field and we need to add it
-            # to the boundary_list
-            if field.adjacent_mines:
-                boundary_list.append(field)
+    def open(self, field):
+        """
+        Open field and return list of newly opened boundary fields
+        """
+        reveal = self.game.reveal(field.row, field.column)
+        for id in reveal.opened.tolist():
+            self.constraints.open(id)
 
-            if field in self.current_adjacent_fields:
-                self.current_adjacent_fields.remove(field)
-        return boundary_list
+        # opened fields with adjacent mines are boundary fields
+        return [self.game.get_field_by_id(id) for id in reveal.boundary]
 
     def make_constraint(self, row_index, col_index):
         """
-        Compute equations for field (row_index, col_index)
+        Add constraint for opened field (row_index, col_index) on its covered neighbours
         """
+        return self.make_constraints([self.game.board[row_index][col_index]])[0]
 
-        adjacent_fields = self.game.get_adjacent_fields(row_index, col_index)
-        adjacent_mines = self.game.get_adjacent_mines(row_index, col_index)
+    def make_constraints(self, fields):
+        """
+        Add constraints for list of opened boundary fields, the state of all their neighbours
+        is read from the board at once
+        """
+        adjacent = [self.game.neighbours[field.id] for field in fields]
+        ids = np.fromiter(itertools.chain.from_iterable(adjacent), dtype=np.int64)
+        covered = self.game.take("covered", ids).tolist()
+        counts = self.game.take("counts", np.array([field.id for field in fields], dtype=np.int64)).tolist()
+
+        constraints = []
+        position = 0
+        for (field, neighbours, mines) in zip(fields, adjacent, counts):
+            assert mines
+            cells = [id for (id, is_covered) in zip(neighbours, covered[position:position + len(neighbours)])
+                     if is_covered]
+            position += len(neighbours)
+            constraints.append(self.constraints.add(field.id, cells, mines))
+        return constraints
+
+    @abstractmethod
+    def solve_component(self, component):
+        """
+        Return lists of ids of component fields that must be mines and that must be safe
+        """
 
-        assert adjacent_mines
-        for field in adjacent_fields:
-            if field not in self.current_adjacent_fields and self.game.board[field.row][field.column].covered:
-                self.current_adjacent_fields.append(field)
+    def solve_coupled(self, components, low, high):
+        """
+        Solve all components together with the total number of mines on the frontier
+        between low and high. Return lists of ids of mines and safe fields.
+        """
+        return [], []
 
-        return adjacent_mines == sum(self.vars[f.row][f.column]
-                                     for f in adjacent_fields if f.covered)
+    def deduce(self):
+        """
+        Find fields on the frontier that must be mines and that must be safe
+        """
+        mines, safe = [], []
+        components = self.constraints.components()
+        solved = {}
+        for component in components:
+            result = self.solved.get(component.constraints)
+            if result is None:
+                result = self.solve_component(component)
+                self.count_wrong(*result)
+                if self.certify:
+                    result = self.certify_result(component.constraints, *result)
+            solved[component.constraints] = result
+            mines += result[0]
+            safe += result[1]
+        self.solved = solved
+
+        # total number of mines is unknown on partial boards analyzed by the service
+        if not mines and not safe and components and self.game.num_mines is not None:
+            # mines that are left must be on the frontier or on the covered fields
+            # not touching any opened field (interior)
+            left = self.game.num_mines - len(self.constraints.mines)
+            interior = self.interior()
+            low, high = max(0, left - interior), left
+            # coupling can only decide something if these bounds cut off some solutions
+            if low > 0 or high < len(self.constraints.frontier):
+                mines, safe = self.solve_coupled(components, low, high)
+                self.count_wrong(mines, safe)
+                if self.certify:
+                    constraints = [constraint for component in components for constraint in component.constraints]
+                    mines, safe = self.certify_result(constraints, mines, safe, low, high)
+
+        return mines, safe
+
+    def wrong_results(self, mines, safe):
+        """
+        Return lists of the mines and safe fields found by the backend that are wrong, None
+        if the game does not know where its mines are (partial boards of the service)
+        """
+        if not hasattr(self.game, "mines"):
+            return None
+        ids = np.array(list(mines) + list(safe), dtype=np.int64)
+        is_mine = self.game.take("mines", ids).tolist() if len(ids) else []
+        return ([id for (id, mine) in zip(mines, is_mine) if not mine],
+                [id for (id, mine) in zip(safe, is_mine[len(mines):]) if mine])
+
+    def count_wrong(self, mines, safe):
+        """
+        Count wrong results of the backend, before they are certified, to see how often
+        each backend errs
+        """
+        wrong = self.wrong_results(mines, safe)
+        if wrong is not None:
+            self.metrics.count("wrong_mines", len(wrong[0]))
+            self.metrics.count("wrong_safe", len(wrong[1]))
 
-    def first_step(self, first_field=None):
-        self.solver.add_constraint(self.game.num_mines == sum(self.vars[i][j]
-                                                              for i in range(0, self.game.board_dim) for j in
-                                                              range(0, self.game.board_dim)))
+    def certify_result(self, constraints, mines, safe, low=None, high=None):
+        """
+        Return the mines and safe fields found by the backend for the constraints (with
+        between low and high mines on all their fields, if given) that are proven by the
+        check chosen with certify: "sat" for exact_check, "lp" for bound_check (only on
+        backends with an LP relaxation, see certify_methods).
+        """
+        check = self.bound_check if self.certify == "lp" else self.exact_check
+        with self.metrics.phase("certify"):
+            certified = check(constraints, mines, safe, low, high)
+        rejected = len(mines) + len(safe) - len(certified[0]) - len(certified[1])
+        self.metrics.count("certified", len(certified[0]) + len(certified[1]))
+        self.metrics.count("rejected", rejected)
+        wrong = self.wrong_results(mines, safe)
+        if rejected and wrong is not None:
+            # rejected results the backend got right, the price of certification
+            kept = set(certified[0]) | set(certified[1])
+            dropped = set(mines) | set(safe)
+            self.metrics.count("rejected_correct", len(dropped - kept - set(wrong[0]) - set(wrong[1])))
+        if rejected:
+            logger.debug("[%s] %d of %d fields not certified", self.name, rejected, len(mines) + len(safe))
+        return certified
+
+    def exact_check(self, constraints, mines, safe, low=None, high=None):
+        """
+        Prove results with a SAT solver: a field is a mine (safe) if the constraints have no
+        solution where it is safe (a mine). Every model found refutes all the results it
+        disagrees with at once, and every proven result is added to the formula.
+        """
+        if self.checker is None:
+            self.checker = SAT(self.game, metrics=Recorder(keep_steps=False), pool=self.pool)
+        solver, variables = self.checker.make_coupled_solver(constraints, low, high)
+        claims = dict.fromkeys(mines, True)
+        claims.update(dict.fromkeys(safe, False))
+        proven_mines, proven_safe = [], []
+        while claims:
+            id, is_mine = next(iter(claims.items()))
+            literal = variables[id] if is_mine else -variables[id]
+            self.metrics.count("certify_checks")
+            if solver.solve(assumptions=[-literal]):
+                model = solver.get_model()
+                for (other, other_is_mine) in list(claims.items()):
+                    if (model[variables[other] - 1] > 0) != other_is_mine:
+                        del claims[other]
+            else:
+                solver.add_clause([literal])
+                (proven_mines if is_mine else proven_safe).append(id)
+                del claims[id]
+        solver.delete()
+        return proven_mines, proven_safe
 
-        for (row_index, row) in enumerate(self.game.board):
-            for (col_index, var) in enumerate(row):
-                self.solver.add_constraint(self.vars[row_index][col_index] >= 0)
-                self.solver.add_constraint(self.vars[row_index][col_index] <= 1)
+    def mark(self, mines, safe):
+        """
+        Show found mines and safe fields on the board
+        """
+        for id in mines:
+            self.game.mark_field_dangerous(self.game.get_field_by_id(id))
+
+        for id in safe:
+            field = self.game.get_field_by_id(id)
+            self.game.mark_field_safe(field)
+            if field.is_mine:
+                logger.debug("[%s-PSST] Pushing mined field %s in possible fields", self.name, field)
+            else:
+                logger.debug("[%s] Pushing field %s in possible fields", self.name, field)
 
+    def first_step(self, first_field=None):
         if first_field:
             row, column = first_field
-            self.newly_opened = self.open(self.game.board[row][column])
+            field = self.game.board[row][column]
         else:
-            self.newly_opened = self.open(self.get_random_field())
+            field = self.get_random_field()
+        with self.metrics.phase("reveal"):
+            self.newly_opened = self.open(field)
 
     def step(self):
-        for new in self.newly_opened:
-            self.solver.add_constraint(self.make_constraint(new.row, new.column))
-
-        possible_fields = []
-        for field in self.current_adjacent_fields:
-            if self.vars[field.row][field.column].value == 1:
-                self.game.mark_field_dangerous(field)
-            else:
-                if field.is_mine:
-                    print("[CST-PSST] Pushing mined field {} in possible fields".format(field))
-                else:
-                    print("[CST]Pushing field {} in possible fields".format(field))
-                possible_fields.append(field)
+        """
+        Run one step: mark fields that must be mines and open one field that must be safe.
 
-                if field in self.game.marked:
-                    self.game.mark_field_safe(field)
+        Returns report of the step (number of solver calls made, mines and safe fields found,
+        frontier size, fields opened, whether the move was a guess and its time), which is
+        also recorded in self.metrics.
+        """
+        metrics = self.metrics
+        start = time.perf_counter()
+        solver_calls = self.solver_calls
+        opened = self.game.opened
+        with metrics.phase("constraints"):
+            self.make_constraints(self.newly_opened)
+        frontier = len(self.constraints.frontier)
+
+        mines, safe = [], []
+        if self.propagate:
+            with metrics.phase("propagate"):
+                mines, safe = self.constraints.propagate()
+            self.mark(mines, safe)
+
+        if self.constraints.safe:
+            possible_fields = self.constraints.safe.snapshot()
+        else:
+            with metrics.phase("deduce"):
+                deduced_mines, deduced_safe = self.deduce()
+            # results of a sound backend are substituted into the constraints, others are only
+            # used for the next move
+            if self.sound:
+                for id in deduced_mines:
+                    self.constraints.resolve(id, True)
+                for id in deduced_safe:
+                    self.constraints.resolve(id, False)
+            self.mark(deduced_mines, deduced_safe)
+            mines += deduced_mines
+            safe += deduced_safe
+            possible_fields = deduced_safe
 
         if possible_fields:
-            print("[CST] Randomly choosing from possible fields: {}".format(possible_fields))
-            new_field = choice(possible_fields)
+            logger.debug("[%s] Randomly choosing from possible fields: %s", self.name, possible_fields)
+            new_field = self.game.get_field_by_id(choice(possible_fields))
         else:
-            print("[CST] I have no idea what to choose next, randomly generating...")
-            new_field = self.get_random_field()
+            logger.debug("[%s] I have no idea what to choose next, guessing...", self.name)
+            with metrics.phase("guess"):
+                new_field = self.guess()
+            metrics.count("guesses")
+
+        with metrics.phase("reveal"):
+            self.newly_opened = self.open(new_field)
+
+        report = self.step_report({
+            "solver_calls": self.solver_calls - solver_calls, "mines": len(mines), "safe": len(safe),
+            "frontier": frontier, "opened": self.game.opened - opened, "guess": not possible_fields,
+            "time": time.perf_counter() - start})
+        metrics.count("opened", report["opened"])
+        metrics.end_step(report)
+        return report
+
+    def step_report(self, report):
+        """
+        Add measurements of the backend to the report of a step
+        """
+        return report
 
-        self.newly_opened = self.open(new_field)
+    def play(self, first_field=None, mines=None):
+        """
+        Play the whole game without GUI. Returns True if the game is won.
+        Mines is an optional stored board, see Minesweeper.set_mines.
+        """
+        if first_field is None:
+            first_field = self.game.random_position()
+        self.game.set_mines(first_field, mines)
 
+        self.first_step(first_field=first_field)
+        while not self.game.is_over():
+            self.step()
+        return self.game.won
 
-class SAT(Strategy):
 
-    def __init__(self, game):
-        self.game = game
-        self.solver = SATSolver(name='minicard')
-        self.current_adjacent_fields = []
-        self.newly_opened = []
-        self.mines = []
-        self.vars = [[0 for _ in range(self.game.board_dim)]
-                     for _ in range(self.game.board_dim)]
+class CSP(Strategy):
+    """
+    Strategy that solves the constraints with one incremental simplex solver.
+
+    Solver contains only the live part of the problem: constraints that still have unknown
+    fields, reduced by the known values, and bounds 0 <= a <= 1 for frontier fields.
+    Constraints whose fields are all resolved are retired, so the tableau tracks the
+    current frontier instead of the whole game history.
+    """
+    name = "CST"
+    # simplex finds one solution of the relaxed problem, fields are not proven mines or safe
+    sound = False
+    certify_methods = ("lp", "sat")
+    # cassowary hashes its variables and constraints by id(), so the vertex it returns, and
+    # with it the moves, can differ between processes for the same seed
+    reproducible = False
+    # values of the relaxation closer than this to 0 or 1 are taken as 0 or 1
+    epsilon = 1e-6
+
+    def __init__(self, game, propagate=True, metrics=None, certify=None, pool=None):
+        # backends are imported only by the strategy that uses them, so processes that need
+        # one strategy (or none) do not load the other solver
+        from cassowary import SimplexSolver
+
+        super().__init__(game, propagate, metrics, certify, pool)
+        self.solver = SimplexSolver()
+        # field id -> (variable, its bound constraints in the solver)
+        self.vars = {}
+        # id of opened field -> (Constraint, its equation in the solver)
+        self.equations = {}
 
-    def get_random_field(self):
-        while True:
-            i = randint(0, self.game.board_dim - 1)
-            j = randint(0, self.game.board_dim - 1)
-            if self.vars[i][j] == 0 and self.game.board[i][j].covered:
-                break
+    def tableau_size(self):
+        """
+        Return number of rows in the simplex tableau
+        """
+        return len(self.solver.rows)
 
-        return self.game.board[i][j]
+    def sync(self):
+        """
+        Update the solver to contain exactly the current constraints
+        """
+        from cassowary import Variable
+
+        live = self.constraints.constraints
+        for source, (constraint, equation) in list(self.equations.items()):
+            if live.get(source) != constraint:
+                self._solver_call(self.solver.remove_constraint, equation)
+                del self.equations[source]
+
+        for id, (variable, bounds) in list(self.vars.items()):
+            if id not in self.constraints.frontier:
+                for bound in bounds:
+                    self._solver_call(self.solver.remove_constraint, bound)
+                del self.vars[id]
+
+        for id in self.constraints.frontier:
+            if id not in self.vars:
+                field = self.game.get_field_by_id(id)
+                variable = Variable("a[{}][{}]".format(field.row, field.column))
+                self.vars[id] = (variable, [self._solver_call(self.solver.add_constraint, variable >= 0),
+                                            self._solver_call(self.solver.add_constraint, variable <= 1)])
+
+        for source, constraint in live.items():
+            if source not in self.equations:
+                equation = constraint.mines == sum(self.vars[id][0] for id in constraint.cells)
+                self.equations[source] = (constraint, self._solver_call(self.solver.add_constraint, equation))
+
+    def deduce(self):
+        self.sync()
+        return super().deduce()
+
+    def solve_component(self, component):
+        # components are independent, so the solution of the whole frontier restricted
+        # to the component is a solution of the component
+        values = [(id, self.vars[id][0].value) for id in component.cells]
+
+        # every field that is not a mine in the found solution is considered safe
+        mines = [id for (id, value) in values if value == 1]
+        safe = [id for (id, value) in values if value != 1]
+        return mines, safe
+
+    def solve_coupled(self, components, low, high):
+        total = sum(self.vars[id][0] for component in components for id in component.cells)
+        bounds = [self._solver_call(self.solver.add_constraint, total >= low),
+                  self._solver_call(self.solver.add_constraint, total <= high)]
+
+        mines, safe = [], []
+        for component in components:
+            component_mines, component_safe = self.solve_component(component)
+            mines += component_mines
+            safe += component_safe
+
+        # bounds are only valid for this step
+        for bound in bounds:
+            self._solver_call(self.solver.remove_constraint, bound)
+        return mines, safe
+
+    def bound_check(self, constraints, mines, safe, low=None, high=None):
+        """
+        A field is safe if its largest value in the relaxation is 0 and a mine if its smallest
+        value is 1. Every solution of the game is a solution of the relaxation, so these fields
+        are certain, but fields decided only by integrality are not proven (exact_check
+        proves those).
 
-    def open(self, field):
-        boundary_list = []
-        for field in self.game.open_field(field):
+        Bounds are found by adding a strong, not required constraint that pulls the field to
+        1 (or 0), the solver then minimizes its error.
+        """
+        from cassowary import STRONG
 
-            # if adjacent_mines is set we are looking at boundary field and we need to add it
-            # to the boundary_list
-            if field.adjacent_mines:
-                boundary_list.append(field)
+        bounds = []
+        if low is not None:
+            cells = {id for constraint in constraints for id in constraint.cells}
+            total = sum(self.vars[id][0] for id in cells)
+            bounds = [self.solver.add_constraint(total >= low), self.solver.add_constraint(total <= high)]
 
-            if field in self.current_adjacent_fields:
-                self.current_adjacent_fields.remove(field)
-        return boundary_list
+        proven_mines, proven_safe = [], []
+        for (ids, target, proven) in ((mines, 0, proven_mines), (safe, 1, proven_safe)):
+            for id in ids:
+                variable = self.vars[id][0]
+                self.metrics.count("certify_checks")
+                probe = self.solver.add_constraint(variable == target, strength=STRONG)
+                if abs(variable.value - target) > 1 - self.epsilon:
+                    proven.append(id)
+                self.solver.remove_constraint(probe)
 
-    def make_constraint(self, row_index, col_index):
+        for bound in bounds:
+            self.solver.remove_constraint(bound)
+        return proven_mines, proven_safe
+
+    def step_report(self, report):
+        report["tableau_size"] = self.tableau_size()
+        return report
+
+
+class SAT(Strategy):
+    name = "SAT"
+
+    # cardinality encodings that support any bound, see pysat.card.EncType
+    encodings = ("native", "seqcounter", "sortnetwrk", "cardnetwrk", "totalizer", "mtotalizer", "kmtotalizer")
+
+    def __init__(self, game, backbone=True, propagate=True, solver_name="minicard", encoding="native",
+                 metrics=None, certify=None, pool=None):
         """
-        Compute equations for field (row_index, col_index)
+        With backbone set, mines and safe fields are found with find_backbone, otherwise
+        every frontier field is checked with two solver calls.
+
+        Solver_name is any pysat solver (e.g. minicard, glucose4, cadical153, lingeling) and
+        encoding is one of SAT.encodings. Native encoding works only with solvers that
+        support cardinality constraints (minicard, gluecard3, gluecard4).
         """
+        from pysat.solvers import NoSuchSolverError, Solver as SATSolver
+
+        super().__init__(game, propagate, metrics, certify, pool)
+        self.backbone = backbone
+        if encoding not in self.encodings:
+            raise ValueError("Unknown cardinality encoding {}, use one of {}".format(encoding, self.encodings))
+        # solver name is checked here, not on the first solve
+        try:
+            with SATSolver(name=solver_name) as solver:
+                if encoding == "native" and not solver.supports_atmost():
+                    raise ValueError("Solver {} has no native cardinality constraints, "
+                                     "use a clausal encoding".format(solver_name))
+        except NoSuchSolverError:
+            raise ValueError("Unknown pysat solver {}".format(solver_name)) from None
+        self.solver_name = solver_name
+        self.encoding = encoding
+
+    def cardinality(self, method, literals, bound, top):
+        """
+        Encode cardinality constraint with CardEnc.method (equals, atleast or atmost), new
+        auxiliary variables are numbered above top. Returns formula and new top.
+        """
+        from pysat.card import CardEnc, EncType
 
-        adjacent_fields = self.game.get_adjacent_fields(row_index, col_index)
-        adjacent_mines = self.game.get_adjacent_mines(row_index, col_index)
+        formula = getattr(CardEnc, method)(lits=literals, bound=bound, top_id=top,
+                                           encoding=getattr(EncType, self.encoding))
+        return formula, max(top, formula.nv)
 
-        assert adjacent_mines
-        for field in adjacent_fields:
-            if field not in self.current_adjacent_fields \
-                    and self.game.board[field.row][field.column].covered \
-                    and field not in self.mines:
-                self.current_adjacent_fields.append(field)
+    def make_solver(self, constraints):
+        """
+        Create solver with all constraints, or take one from the pool. Fields are numbered
+        in the order they appear above the variables the solver already has, returns solver
+        and dict field id -> variable.
+        """
+        from pysat.solvers import Solver as SATSolver
 
-        literals = []
-        for field in adjacent_fields:
-            if field.covered:
-                literals.append(field.id)
+        if self.pool is not None:
+            solver = self.pool.get(self.solver_name, self.encoding)
+            top = solver.nof_vars()
+        else:
+            solver = SATSolver(name=self.solver_name)
+            top = 0
+
+        variables = {}
+        for constraint in constraints:
+            for id in constraint.cells:
+                variables.setdefault(id, top + len(variables) + 1)
+        top += len(variables)
+        for constraint in constraints:
+            formula, top = self.cardinality("equals", [variables[id] for id in constraint.cells],
+                                            constraint.mines, top)
+            solver.append_formula(formula)
+        return solver, variables
+
+    def find_backbone(self, solver, variables):
+        """
+        Find fields that have the same value in every model of the formula.
 
-        return CardEnc.equals(lits=literals, bound=adjacent_mines, encoding=EncType.native)
+        We start from one model and drop every field whose value flips in any later model.
+        Calls with a temporary clause that requires at least one candidate to flip are repeated
+        while they drop more candidates at once, if the clause is unsatisfiable all remaining
+        candidates are decided. Candidates left after that are probed one by one with a single
+        assumption. Before every call phases are set to the flipped values, so each new model
+        drops as many candidates as possible.
 
-    def first_step(self, first_field=None):
-        self.solver.append_formula(
-            CardEnc.equals(lits=list(range(1, self.game.board_dim ** 2 + 1)), bound=self.game.num_mines,
-                           encoding=EncType.native))
+        Returns lists of ids of fields that are always mines and always safe.
+        """
+        if not self._solver_call(solver.solve):
+            logger.warning("[%s] Constraints have no solution, the board is inconsistent", self.name)
+            return [], []
+        model = solver.get_model()
+        # literal of every candidate that is true in all models found so far
+        literals = {id: model[variable - 1] for id, variable in variables.items()}
+        # variables above the field variables are used as selectors of temporary clauses
+        top = solver.nof_vars()
+
+        def drop_flipped():
+            model = solver.get_model()
+            for id, literal in list(literals.items()):
+                if model[variables[id] - 1] != literal:
+                    del literals[id]
+
+        while literals:
+            # clause is active only while its selector variable is assumed
+            top += 1
+            selector = top
+            solver.add_clause([-selector] + [-literal for literal in literals.values()])
+            solver.set_phases([-literal for literal in literals.values()])
+            flipped = self._solver_call(solver.solve, assumptions=[selector])
+            remaining = len(literals)
+            # model has to be read before the solver is changed
+            if flipped:
+                drop_flipped()
+            solver.add_clause([-selector])
+            if not flipped:
+                break
 
-        if first_field:
-            row, column = first_field
-            self.newly_opened = self.open(self.game.board[row][column])
-        else:
-            self.newly_opened = self.open(self.get_random_field())
+            # when models flip only single candidates it is cheaper to probe them one by one
+            if remaining - len(literals) > 1:
+                continue
 
-    def step(self):
-        for new in self.newly_opened:
-            self.solver.append_formula(self.make_constraint(new.row, new.column))
-
-        possible_fields = []
-        for field in self.current_adjacent_fields:
-            # negative value -> clear field, positive value -> mine
-            sat_clear = self.solver.solve(assumptions=self.mines + [-field.id])
-            sat_mine = self.solver.solve(assumptions=self.mines + [field.id])
-            # if unsatisfiable when field is clear -> mark field as mine
-            if not sat_clear:
-                self.game.mark_field_dangerous(field)
-                self.vars[field.row][field.column] = 1
-                self.current_adjacent_fields.remove(field)
-                self.mines.append(field.id)
-            # if unsatisfiable when filed is mine -> mark field as safe
-            elif not sat_mine:
-                self.game.mark_field_safe(field)
-                self.vars[field.row][field.column] = 0
-                if field.is_mine:
-                    print("[SAT-PSST] Pushing mined field {} in possible fields".format(field))
+            for id in list(literals):
+                if id not in literals:
+                    continue
+                solver.set_phases([-literal for literal in literals.values()])
+                if self._solver_call(solver.solve, assumptions=[-literals[id]]):
+                    drop_flipped()
                 else:
-                    print("[SAT] Pushing field {} in possible fields".format(field))
-                possible_fields.append(field)
+                    # value is known now, fix it for the next calls
+                    solver.add_clause([literals[id]])
+            break
 
-        if possible_fields:
-            print("[SAT] Randomly choosing from possible fields: {}".format(possible_fields))
-            new_field = choice(possible_fields)
-        else:
-            print("[SAT] I have no idea what to choose next, randomly generating...")
-            new_field = self.get_random_field()
+        mines = [id for id, literal in literals.items() if literal > 0]
+        safe = [id for id, literal in literals.items() if literal < 0]
+        return mines, safe
 
-        self.newly_opened = self.open(new_field)
+    def solve(self, solver, variables):
+        if self.backbone:
+            mines, safe = self.find_backbone(solver, variables)
+        else:
+            mines, safe = [], []
+            for id, variable in variables.items():
+                # negative value -> clear field, positive value -> mine
+                sat_clear = self._solver_call(solver.solve, assumptions=[-variable])
+                sat_mine = self._solver_call(solver.solve, assumptions=[variable])
+                # if unsatisfiable when field is clear -> field is mine
+                if not sat_clear:
+                    mines.append(id)
+                # if unsatisfiable when filed is mine -> field is safe
+                elif not sat_mine:
+                    safe.append(id)
+        solver.delete()
+        return mines, safe
+
+    def solve_component(self, component):
+        return self.solve(*self.make_solver(component.constraints))
+
+    def make_coupled_solver(self, constraints, low=None, high=None):
+        """
+        Create solver like make_solver, with between low and high mines on all fields
+        of the constraints if the bounds are given.
+        """
+        solver, variables = self.make_solver(constraints)
+        literals = list(variables.values())
+        top = solver.nof_vars()
+        if low is not None and low > 0:
+            formula, top = self.cardinality("atleast", literals, low, top)
+            solver.append_formula(formula)
+        if high is not None and high < len(literals):
+            formula, top = self.cardinality("atmost", literals, high, top)
+            solver.append_formula(formula)
+        return solver, variables
+
+    def solve_coupled(self, components, low, high):
+        return self.solve(*self.make_coupled_solver([constraint for component in components
+                                                     for constraint in component.constraints], low, high))
+
+
+# strategies by the name used on command lines and in service requests
+STRATEGIES = {"CSP": CSP, "SAT": SAT}